@@ -1,19 +1,714 @@
 import os
 import argparse
+import asyncio
+import email.utils
+import hashlib
+import mimetypes
+import mmap
+import posixpath
+import stat
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BufferedReader, BytesIO
+from contextlib import suppress
+from functools import partial
+from http import HTTPStatus
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 
+CORS_HEADERS = (
+    ("Access-Control-Allow-Origin", "*"),
+    ("Access-Control-Allow-Methods", "GET, OPTIONS"),
+    ("Access-Control-Allow-Headers", "*"),
+)
+
+# encodings of the precompressed siblings, in order of preference
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+INDEX_FILES = ("index.html", "index.htm")
+
+backend_single = "single"
+backend_threaded = "threaded"
+backend_asyncio = "asyncio"
+
+range_unsatisfiable = "unsatisfiable"
+
+# smaller bodies are cheaper to copy than to set up a sendfile for
+SENDFILE_THRESHOLD = 1 << 16
+
+# path -> (mtime_ns, size, etag), so files are only hashed when they change
+ETAGS = {}
+
+def accepted_encodings(accept_encoding: str):
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip().removeprefix("q=")
+        try:
+            if params and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def resolve_file(path: str):
+    # path comes from translate_path, which keeps the trailing slash of directories
+    if os.path.isdir(path):
+        if not path.endswith("/"):
+            return None
+        for index in INDEX_FILES:
+            if os.path.isfile(os.path.join(path, index)):
+                return os.path.join(path, index)
+        return None
+    if path.endswith("/") or not os.path.isfile(path):
+        return None
+    return path
+
+
+def select_variant(path: str, accept_encoding: str):
+    accepted = accepted_encodings(accept_encoding)
+    mtime_ns = None
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding not in accepted and "*" not in accepted:
+            continue
+        if mtime_ns is None:
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                return path, None
+        if is_current_sibling(path + suffix, mtime_ns):
+            return path + suffix, encoding
+    return path, None
+
+
+def is_current_sibling(path: str, mtime_ns: int):
+    # compress.py gives a sibling the mtime of its original, any other sibling is left
+    # over from an older version of the file
+    try:
+        fs = os.stat(path)
+    except OSError:
+        return False
+    return stat.S_ISREG(fs.st_mode) and fs.st_mtime_ns == mtime_ns
+
+
+def etag_for(path: str, fs):
+    cached = ETAGS.get(path)
+    if cached and cached[0] == fs.st_mtime_ns and cached[1] == fs.st_size:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()[:32]}"'
+    ETAGS[path] = (fs.st_mtime_ns, fs.st_size, etag)
+    return etag
+
+
+def is_not_modified(if_none_match, if_modified_since, etag: str, mtime: float):
+    if if_none_match is not None:
+        # If-None-Match uses the weak comparison and overrides If-Modified-Since
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates
+
+    if if_modified_since is None:
+        return False
+    try:
+        since = email.utils.parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+    if since is None or since.tzinfo is None:
+        return False
+    return int(mtime) <= since.timestamp()
+
+
+def parse_range(range_header: str, size: int):
+    unit, _, spec = range_header.partition("=")
+    # several ranges would need a multipart body, the whole file is sent instead
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = (part.strip() for part in spec.partition("-"))
+    if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first and not last:
+        return None
+
+    if not first:
+        # a suffix range, the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+        if int(last) == 0:
+            return range_unsatisfiable
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    if start >= size:
+        return range_unsatisfiable
+    return start, end - start + 1
+
+
+def range_applies(if_range, etag, mtime: float):
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', "W/")):
+        # If-Range uses the strong comparison, weak tags never match
+        return etag is not None and if_range == etag
+    try:
+        since = email.utils.parsedate_to_datetime(if_range)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+    return since is not None and since.tzinfo is not None and int(mtime) == since.timestamp()
+
+
+def send_file(sock, f, offset: int, count: int):
+    if count <= 0:
+        return
+    if hasattr(os, "sendfile"):
+        # the kernel copies from the page cache straight to the socket
+        sock.sendfile(f, offset, count)
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped)[offset:offset + count] as view:
+            sock.sendall(view)
+
+
+def cache_headers(ctype: str, etag: str, encoding, max_age: int):
+    headers = [("ETag", etag)]
+    if ctype.startswith("text/html"):
+        # pages keep their URL across builds, browsers must revalidate them
+        headers.append(("Cache-Control", "no-cache"))
+    else:
+        headers.append(("Cache-Control", f"public, max-age={max_age}"))
+    headers.append(("Vary", "Accept-Encoding"))
+    if encoding:
+        headers.append(("Content-Encoding", encoding))
+    return headers
+
+
+class CachedFile():
+    __slots__ = ("path", "variants", "signature", "checked_at", "size")
+
+    def __init__(self, path: str, variants: dict, signature, checked_at: float):
+        self.path = path
+        # encoding -> (body, response headers, etag, mtime), None being the identity
+        self.variants = variants
+        self.signature = signature
+        self.checked_at = checked_at
+        self.size = sum(len(variant[0]) for variant in variants.values())
+
+
+    def select(self, accept_encoding: str):
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, _ in PRECOMPRESSED:
+            if (encoding in accepted or "*" in accepted) and encoding in self.variants:
+                return encoding
+        return None
+
+
+class FileCache():
+    def __init__(self, max_bytes: int, max_file_bytes=1 << 20, revalidate_after=1.0, max_age=3600):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        # files are only stat()ed again once this many seconds have passed
+        self.revalidate_after = revalidate_after
+        self.max_age = max_age
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+    def get(self, key: str):
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+
+        now = time.monotonic()
+        if now - cached.checked_at > self.revalidate_after:
+            if self.__signature(cached.path) != cached.signature:
+                self.__remove(key, cached)
+                with self.lock:
+                    self.misses += 1
+                return None
+            cached.checked_at = now
+
+        with self.lock:
+            self.hits += 1
+        return cached
+
+
+    def load(self, key: str, path: str, ctype: str):
+        signature = self.__signature(path)
+        if signature[0] is None or signature[0][1] > self.max_file_bytes:
+            return None
+
+        variants = {}
+        for (encoding, suffix), file_signature in zip(((None, ""),) + PRECOMPRESSED, signature):
+            if file_signature is None or file_signature[1] > self.max_file_bytes:
+                continue
+            if encoding is not None and file_signature[0] != signature[0][0]:
+                # a sibling older or newer than the original is not served
+                continue
+            try:
+                with open(path + suffix, 'rb') as f:
+                    body = f.read()
+                    fs = os.fstat(f.fileno())
+            except OSError:
+                continue
+            variants[encoding] = self.__variant(body, fs, ctype, encoding)
+
+        if None not in variants:
+            return None
+
+        cached = CachedFile(path, variants, signature, time.monotonic())
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self.entries[key] = cached
+            self.size += cached.size
+            while self.size > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.size
+        return cached
+
+
+    def __variant(self, body: bytes, fs, ctype: str, encoding):
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        headers = [
+            ("Content-type", ctype),
+            ("Content-Length", str(len(body))),
+            ("Last-Modified", email.utils.formatdate(fs.st_mtime, usegmt=True)),
+        ]
+        headers += cache_headers(ctype, etag, encoding, self.max_age)
+        if encoding is None:
+            headers.append(("Accept-Ranges", "bytes"))
+        return body, headers, etag, fs.st_mtime
+
+
+    def __signature(self, path: str):
+        signature = []
+        for suffix in ("",) + tuple(suffix for _, suffix in PRECOMPRESSED):
+            try:
+                fs = os.stat(path + suffix)
+            except OSError:
+                signature.append(None)
+                continue
+            signature.append((fs.st_mtime_ns, fs.st_size))
+        return tuple(signature)
+
+
+    def __remove(self, key: str, cached: CachedFile):
+        with self.lock:
+            if self.entries.get(key) is cached:
+                del self.entries[key]
+                self.size -= cached.size
+
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size,
+                    "hits": self.hits, "misses": self.misses}
+
+
 class CORSHTTPRequestHandler(SimpleHTTPRequestHandler):
+    # (offset, count) of the file to send, set by send_head for range requests
+    body_range = None
+
     def end_headers(self):
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "*")
+        for name, value in CORS_HEADERS:
+            self.send_header(name, value)
         super().end_headers()
 
+
+    def copyfile(self, source, outputfile):
+        body_range, self.body_range = self.body_range, None
+        if not isinstance(source, BufferedReader):
+            return super().copyfile(source, outputfile)
+
+        if body_range is None:
+            offset = source.tell()
+            body_range = (offset, os.fstat(source.fileno()).st_size - offset)
+        offset, count = body_range
+        if count >= SENDFILE_THRESHOLD:
+            send_file(self.connection, source, offset, count)
+            return
+        source.seek(offset)
+        outputfile.write(source.read(count))
+
+
     def do_OPTIONS(self):
         self.send_response(200, "OK")
+        # without a length, keep-alive clients would wait for a body
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
 
+class CachingHTTPRequestHandler(CORSHTTPRequestHandler):
+    max_age = 3600
+    file_cache = None
+
+    def send_head(self):
+        # a HEAD request leaves no body to send, nothing may carry over to the next request
+        self.body_range = None
+        range_header = self.headers.get("Range")
+        use_cache = self.file_cache is not None and range_header is None
+        if use_cache:
+            # a hit is answered without looking the path up on the disk
+            key = urllib.parse.urlsplit(self.path).path
+            cached = self.file_cache.get(key)
+            if cached is not None:
+                return self.send_cached(cached)
+
+        path = resolve_file(self.translate_path(self.path))
+        if path is None:
+            # redirects, listings and errors are left to SimpleHTTPRequestHandler
+            return super().send_head()
+
+        if use_cache:
+            cached = self.file_cache.load(key, path, self.guess_type(path))
+            if cached is not None:
+                return self.send_cached(cached)
+
+        ctype = self.guess_type(path)
+        served_path, encoding = path, None
+        if range_header is None:
+            # ranges are offsets into the file itself, never into a compressed sibling
+            served_path, encoding = select_variant(path, self.headers.get("Accept-Encoding", ""))
+        try:
+            f = open(served_path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        try:
+            fs = os.fstat(f.fileno())
+            etag = etag_for(served_path, fs)
+            if is_not_modified(self.headers.get("If-None-Match"),
+                               self.headers.get("If-Modified-Since"), etag, fs.st_mtime):
+                f.close()
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_cache_headers(ctype, etag, encoding)
+                self.end_headers()
+                return None
+
+            body_range = None
+            if range_header is not None and range_applies(self.headers.get("If-Range"),
+                                                          etag, fs.st_mtime):
+                body_range = parse_range(range_header, fs.st_size)
+            if body_range == range_unsatisfiable:
+                f.close()
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{fs.st_size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+
+            if body_range is None:
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Length", str(fs.st_size))
+            else:
+                offset, count = body_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range",
+                                 f"bytes {offset}-{offset + count - 1}/{fs.st_size}")
+                self.send_header("Content-Length", str(count))
+                self.body_range = body_range
+            self.send_header("Content-type", ctype)
+            self.send_header("Last-Modified", self.date_time_string(fs.st_mtime))
+            if encoding is None:
+                self.send_header("Accept-Ranges", "bytes")
+            self.send_cache_headers(ctype, etag, encoding)
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+
+    def send_cached(self, cached: CachedFile):
+        encoding = cached.select(self.headers.get("Accept-Encoding", ""))
+        body, headers, etag, mtime = cached.variants[encoding]
+        if is_not_modified(self.headers.get("If-None-Match"),
+                           self.headers.get("If-Modified-Since"), etag, mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            # the cache headers follow the body ones
+            for name, value in headers[3:]:
+                self.send_header(name, value)
+            self.end_headers()
+            return None
+
+        self.send_response(HTTPStatus.OK)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        return BytesIO(body)
+
+
+    def send_cache_headers(self, ctype: str, etag: str, encoding):
+        for name, value in cache_headers(ctype, etag, encoding, self.max_age):
+            self.send_header(name, value)
+
+
+class BoundedThreadingHTTPServer(HTTPServer):
+    def __init__(self, server_address, handler_class, max_workers=64):
+        # a fixed pool instead of a thread per connection, extra connections wait
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        super().__init__(server_address, handler_class)
+
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncHTTPServer():
+    server_version = "buzz-asyncio"
+    max_header_lines = 100
+
+    def __init__(self, directory: str, production=False, max_age=3600, keep_alive_timeout=15.0,
+                 file_cache=None):
+        self.directory = os.path.abspath(directory)
+        self.production = production
+        self.max_age = max_age
+        self.keep_alive_timeout = keep_alive_timeout
+        self.file_cache = file_cache
+
+
+    async def serve(self, port: int, backlog=4096):
+        server = await asyncio.start_server(self.handle, "", port, backlog=backlog)
+        async with server:
+            await server.serve_forever()
+
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(),
+                                                          self.keep_alive_timeout)
+                    if not request_line:
+                        break
+                    parts = request_line.decode('latin-1').split()
+                    headers = await self.read_headers(reader)
+                except asyncio.TimeoutError:
+                    # idle, or too slow to send its request, the connection is just closed
+                    break
+                except ValueError:
+                    # a line longer than the limit of the reader
+                    parts, headers = (), None
+                if len(parts) != 3 or headers is None:
+                    await self.send_error(writer, HTTPStatus.BAD_REQUEST, False)
+                    break
+
+                method, target, version = parts
+                # requests we serve have no body, but one must not be read as the next request
+                length = headers.get("content-length", "0")
+                if length.isdigit() and int(length):
+                    await reader.readexactly(int(length))
+
+                keep_alive = self.is_keep_alive(version, headers)
+                await self.respond(writer, method, target, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+    async def read_headers(self, reader):
+        headers = {}
+        for _ in range(self.max_header_lines):
+            line = await asyncio.wait_for(reader.readline(), self.keep_alive_timeout)
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, sep, value = line.decode('latin-1').partition(":")
+            if not sep:
+                return None
+            headers[name.strip().lower()] = value.strip()
+        return None
+
+
+    def is_keep_alive(self, version: str, headers: dict):
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+
+    def translate_path(self, target: str):
+        path = urllib.parse.urlsplit(target).path
+        trailing_slash = path.endswith("/")
+        path = posixpath.normpath(urllib.parse.unquote(path))
+        words = [word for word in path.split("/")
+                 if word and word not in (".", "..") and not os.path.dirname(word)]
+        path = os.path.join(self.directory, *words)
+        if trailing_slash:
+            path += "/"
+        return path
+
+
+    async def respond(self, writer, method: str, target: str, headers: dict, keep_alive: bool):
+        if method == "OPTIONS":
+            await self.send(writer, HTTPStatus.OK, [("Content-Length", "0")], keep_alive)
+            return
+        if method not in ("GET", "HEAD"):
+            await self.send_error(writer, HTTPStatus.NOT_IMPLEMENTED, keep_alive)
+            return
+
+        range_header = headers.get("range")
+        key = None
+        if self.file_cache is not None and range_header is None:
+            # a hit is answered without looking the path up on the disk
+            key = urllib.parse.urlsplit(target).path
+            cached = self.file_cache.get(key)
+            if cached is not None:
+                await self.send_cached(writer, method, headers, cached, keep_alive)
+                return
+
+        # looking the file up, reading it into the cache or hashing it would hold up every
+        # other connection, that is left to a thread
+        found = await asyncio.to_thread(self.open_file, target, headers, key)
+        kind = found[0]
+        if kind == "redirect":
+            await self.send(writer, HTTPStatus.MOVED_PERMANENTLY,
+                            [("Location", found[1]), ("Content-Length", "0")], keep_alive)
+            return
+        if kind == "missing":
+            await self.send_error(writer, HTTPStatus.NOT_FOUND, keep_alive)
+            return
+        if kind == "cached":
+            await self.send_cached(writer, method, headers, found[1], keep_alive)
+            return
+
+        _, f, fs, ctype, etag, encoding = found
+        with f:
+            response_headers = [("Content-Type", ctype)]
+            if self.production:
+                if is_not_modified(headers.get("if-none-match"),
+                                   headers.get("if-modified-since"), etag, fs.st_mtime):
+                    await self.send(writer, HTTPStatus.NOT_MODIFIED,
+                                    cache_headers(ctype, etag, encoding, self.max_age), keep_alive)
+                    return
+                response_headers += cache_headers(ctype, etag, encoding, self.max_age)
+
+            body_range = None
+            if range_header is not None and range_applies(headers.get("if-range"), etag,
+                                                          fs.st_mtime):
+                body_range = parse_range(range_header, fs.st_size)
+            if body_range == range_unsatisfiable:
+                await self.send(writer, HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+                                [("Content-Range", f"bytes */{fs.st_size}"),
+                                 ("Content-Length", "0")], keep_alive)
+                return
+
+            status = HTTPStatus.OK
+            offset, count = 0, fs.st_size
+            if body_range is not None:
+                status = HTTPStatus.PARTIAL_CONTENT
+                offset, count = body_range
+                response_headers.append(("Content-Range",
+                                         f"bytes {offset}-{offset + count - 1}/{fs.st_size}"))
+            if encoding is None:
+                response_headers.append(("Accept-Ranges", "bytes"))
+            response_headers.append(("Content-Length", str(count)))
+            response_headers.append(("Last-Modified", email.utils.formatdate(fs.st_mtime, usegmt=True)))
+            await self.send(writer, status, response_headers, keep_alive)
+            if method == "GET" and count:
+                # the kernel copies the file to the socket where it can
+                await asyncio.get_running_loop().sendfile(writer.transport, f, offset, count)
+
+
+    def open_file(self, target: str, headers: dict, cache_key=None):
+        # ("redirect", location), ("missing",), ("cached", cached file) or
+        # ("file", open file, its stat, content type, etag, encoding)
+        path = self.translate_path(target)
+        if os.path.isdir(path) and not path.endswith("/"):
+            parts = urllib.parse.urlsplit(target)
+            return "redirect", urllib.parse.urlunsplit(parts._replace(path=parts.path + "/"))
+        path = resolve_file(path)
+        if path is None:
+            return ("missing",)
+
+        ctype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if cache_key is not None:
+            cached = self.file_cache.load(cache_key, path, ctype)
+            if cached is not None:
+                return "cached", cached
+
+        served_path, encoding = path, None
+        if self.production and "range" not in headers:
+            served_path, encoding = select_variant(path, headers.get("accept-encoding", ""))
+        try:
+            f = open(served_path, 'rb')
+        except OSError:
+            return ("missing",)
+        try:
+            fs = os.fstat(f.fileno())
+            etag = etag_for(served_path, fs) if self.production else None
+        except Exception:
+            f.close()
+            raise
+        return "file", f, fs, ctype, etag, encoding
+
+
+    async def send_cached(self, writer, method: str, headers: dict, cached: CachedFile,
+                          keep_alive: bool):
+        encoding = cached.select(headers.get("accept-encoding", ""))
+        body, response_headers, etag, mtime = cached.variants[encoding]
+        if is_not_modified(headers.get("if-none-match"), headers.get("if-modified-since"),
+                           etag, mtime):
+            await self.send(writer, HTTPStatus.NOT_MODIFIED, response_headers[3:], keep_alive)
+            return
+        await self.send(writer, HTTPStatus.OK, response_headers, keep_alive,
+                        body if method == "GET" else b"")
+
+
+    async def send(self, writer, status: HTTPStatus, headers, keep_alive: bool, body=b""):
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Server: {self.server_version}",
+            f"Date: {email.utils.formatdate(usegmt=True)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines += [f"{name}: {value}" for name, value in headers]
+        lines += [f"{name}: {value}" for name, value in CORS_HEADERS]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+
+    async def send_error(self, writer, status: HTTPStatus, keep_alive: bool):
+        body = f"<html><body><h1>{status.value} {status.phrase}</h1></body></html>".encode()
+        headers = [("Content-Type", "text/html;charset=utf-8"), ("Content-Length", str(len(body)))]
+        await self.send(writer, status, headers, keep_alive, body)
+
+
 def run(
     server_class=HTTPServer,
     handler_class=CORSHTTPRequestHandler,
@@ -21,20 +716,79 @@ def run(
     directory=None,
 ):
     if directory:
-        os.chdir(directory)
+        # files are looked up by path on every request, not from a working directory,
+        # so a build swapped into place is served right away
+        handler_class = partial(handler_class, directory=os.path.abspath(directory))
     server_address = ("", port)
     httpd = server_class(server_address, handler_class)
     print(f"Serving HTTP on http://localhost:{port} from directory '{directory}'...")
     httpd.serve_forever()
 
 
+def run_async(port=8000, directory=None, production=False, max_age=3600, file_cache=None):
+    server = AsyncHTTPServer(directory or ".", production, max_age, file_cache=file_cache)
+    print(f"Serving HTTP on http://localhost:{port} from directory '{directory}' with asyncio...")
+    with suppress(KeyboardInterrupt):
+        asyncio.run(server.serve(port))
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="HTTP Server with CORS")
     parser.add_argument(
         "--dir", type=str, help="Directory to serve files from", default="."
     )
     parser.add_argument("--port", type=int, help="Port to serve HTTP on", default=8888)
+    parser.add_argument(
+        "--production", action="store_true",
+        help="Send ETags and Cache-Control headers, answer conditional requests with 304 "
+             "and serve precompressed .br/.gz siblings",
+    )
+    parser.add_argument(
+        "--max-age", type=int, default=CachingHTTPRequestHandler.max_age,
+        help="Cache-Control max-age of everything but HTML pages in production mode",
+    )
+    parser.add_argument(
+        "--backend", choices=[backend_single, backend_threaded, backend_asyncio],
+        default=backend_single,
+        help="Serve one request at a time, from a bounded thread pool, or with asyncio",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=64, help="Size of the thread pool of the threaded backend"
+    )
+    parser.add_argument(
+        "--cache-size", type=float, default=0,
+        help="Keep up to this many MB of small files in memory in production mode, 0 disables it",
+    )
+    parser.add_argument(
+        "--cache-revalidate", type=float, default=1.0,
+        help="Seconds before a cached file is checked against the disk again",
+    )
     args = parser.parse_args()
+    if args.cache_size and not args.production:
+        parser.error("--cache-size requires --production")
+
+    file_cache = None
+    if args.cache_size > 0:
+        file_cache = FileCache(int(args.cache_size * (1 << 20)),
+                               revalidate_after=args.cache_revalidate, max_age=args.max_age)
+
+    if args.backend == backend_asyncio:
+        run_async(port=args.port, directory=args.dir, production=args.production,
+                  max_age=args.max_age, file_cache=file_cache)
+    else:
+        handler_class = CORSHTTPRequestHandler
+        if args.production:
+            CachingHTTPRequestHandler.max_age = args.max_age
+            CachingHTTPRequestHandler.file_cache = file_cache
+            handler_class = CachingHTTPRequestHandler
 
-    run(port=args.port, directory=args.dir)
+        server_class = HTTPServer
+        if args.backend == backend_threaded:
+            # connections stay open between requests, each one holding a worker
+            handler_class.protocol_version = "HTTP/1.1"
+            handler_class.timeout = 15
+            server_class = lambda address, handler: BoundedThreadingHTTPServer(
+                address, handler, max_workers=args.workers)
 
+        run(server_class=server_class, handler_class=handler_class, port=args.port,
+            directory=args.dir)
@@ -0,0 +1,188 @@
+import errno
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from manifest import hash_file
+
+compare_mtime = "mtime"
+compare_hash = "hash"
+
+link_copy = "copy"
+link_hardlink = "hardlink"
+link_reflink = "reflink"
+
+# ioctl request cloning a whole file on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+class SyncStats():
+    def __init__(self):
+        self.copied = 0
+        self.skipped = 0
+        self.removed = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+
+    def files_per_sec(self):
+        return self.copied / self.seconds if self.seconds else 0.0
+
+
+    def bytes_per_sec(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+    def __repr__(self):
+        return (f"SyncStats(copied = {self.copied}, skipped = {self.skipped}, "
+                f"removed = {self.removed}, bytes = {self.bytes}, seconds = {self.seconds:.3f})")
+
+
+def sync_dir(src: str, dst: str, manifest=None, compare=compare_mtime, link=link_copy,
+             workers=1):
+    if not os.path.exists(src):
+        raise FileNotFoundError(f"Source directory does not exist: {src}")
+    if compare not in (compare_mtime, compare_hash):
+        raise ValueError(f"Invalid comparison {compare}")
+    if link not in (link_copy, link_hardlink, link_reflink):
+        raise ValueError(f"Invalid link mode {link}")
+
+    start = perf_counter()
+    stats = SyncStats()
+    # without a manifest we cannot tell stale assets from generated pages
+    synced = manifest.assets if manifest is not None else {}
+    seen = set()
+    created_dirs = set()
+    copies = []
+
+    for rel_path, src_path, stat in walk_files(src):
+        seen.add(rel_path)
+        dst_path = os.path.join(dst, rel_path)
+        entry = synced.get(rel_path)
+
+        if __is_unchanged(entry, src_path, dst_path, stat, compare, manifest is not None):
+            stats.skipped += 1
+            continue
+
+        # directories are created up front, the copies may then run in any order
+        opdir = os.path.dirname(dst_path)
+        if opdir not in created_dirs:
+            os.makedirs(opdir, exist_ok=True)
+            created_dirs.add(opdir)
+        copies.append((rel_path, src_path, dst_path, stat))
+
+    copy_jobs = [(src_path, dst_path, link, compare) for _, src_path, dst_path, _ in copies]
+    if workers <= 1 or len(copies) <= 1:
+        hashes = [__copy_job(job) for job in copy_jobs]
+    else:
+        # copying is I/O bound, threads overlap the waits on the storage
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            hashes = list(executor.map(__copy_job, copy_jobs))
+
+    for (rel_path, _, _, stat), content_hash in zip(copies, hashes):
+        stats.copied += 1
+        stats.bytes += stat.st_size
+        if manifest is not None:
+            synced[rel_path] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": content_hash,
+            }
+
+    for rel_path in sorted(set(synced) - seen):
+        del synced[rel_path]
+        dst_path = os.path.join(dst, rel_path)
+        if os.path.exists(dst_path):
+            os.remove(dst_path)
+            stats.removed += 1
+
+    stats.seconds = perf_counter() - start
+    return stats
+
+
+def __copy_job(job):
+    src_path, dst_path, link, compare = job
+    copy_file(src_path, dst_path, link)
+    return hash_file(src_path) if compare == compare_hash else None
+
+
+def __is_unchanged(entry, src_path: str, dst_path: str, stat, compare: str, has_manifest: bool):
+    if not os.path.exists(dst_path):
+        return False
+
+    if not has_manifest:
+        # copies preserve mtimes, so an up to date copy looks just like its source
+        dst_stat = os.stat(dst_path)
+        return (dst_stat.st_size == stat.st_size
+                and dst_stat.st_mtime_ns == stat.st_mtime_ns)
+
+    if entry is None:
+        return False
+    if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        return True
+    if compare != compare_hash or entry["hash"] is None:
+        return False
+
+    # touched but possibly not modified, the content hash decides
+    if hash_file(src_path) != entry["hash"]:
+        return False
+    entry["mtime_ns"] = stat.st_mtime_ns
+    entry["size"] = stat.st_size
+    return True
+
+
+def walk_files(root: str, rel_dir=""):
+    # (path relative to root, path, stat) of every file below root, in sorted order;
+    # what is neither a file nor a directory, a dangling link say, is skipped
+    with os.scandir(os.path.join(root, rel_dir)) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            rel_path = os.path.join(rel_dir, entry.name)
+            if entry.is_dir():
+                yield from walk_files(root, rel_path)
+            elif entry.is_file():
+                yield rel_path, entry.path, entry.stat()
+
+
+def copy_file(src_path: str, dst_path: str, link=link_copy):
+    # the new file is put in place with a rename, never written over in place,
+    # so hard links and clones of the previous version are left untouched
+    tmp_path = dst_path + ".buzz-tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+
+    if link == link_hardlink:
+        try:
+            os.link(src_path, tmp_path)
+            os.replace(tmp_path, dst_path)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+
+    if link == link_reflink and __reflink(src_path, tmp_path):
+        os.replace(tmp_path, dst_path)
+        return
+
+    shutil.copy2(src_path, tmp_path)
+    os.replace(tmp_path, dst_path)
+
+
+def __reflink(src_path: str, dst_path: str):
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    with open(src_path, 'rb') as src_file, open(dst_path, 'wb') as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            cloned = False
+        else:
+            cloned = True
+
+    if not cloned:
+        os.remove(dst_path)
+        return False
+    shutil.copystat(src_path, dst_path)
+    return True
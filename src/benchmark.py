@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from block_md2text import markdown_to_html_node
+from buzz import generate_page, generate_pages_recursive, page_url_path
+from template import load_template
+
+DEFAULT_MIX = {
+    "heading": 2,
+    "paragraph": 6,
+    "unordered_list": 2,
+    "ordered_list": 1,
+    "code": 1,
+    "quote": 1,
+}
+
+WORDS = (
+    "the ring of power was forged in the fires of mount doom by sauron "
+    "lord of mordor while elves dwarves and men held the lesser rings"
+).split()
+
+def generate_corpus(dest_dir: str, pages: int, blocks_per_page: int, mix: dict,
+                    pages_per_dir=100, seed=0):
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+
+    for page in range(pages):
+        page_dir = os.path.join(dest_dir, f"section{page // pages_per_dir}")
+        os.makedirs(page_dir, exist_ok=True)
+
+        blocks = [f"# Page {page}"]
+        for kind in rng.choices(kinds, weights, k=blocks_per_page):
+            blocks.append(__generate_block(rng, kind, pages, pages_per_dir))
+
+        with open(os.path.join(page_dir, f"page{page}.md"), 'w') as f:
+            f.write("\n\n".join(blocks) + "\n")
+
+
+def __generate_block(rng, kind: str, pages: int, pages_per_dir: int):
+    if kind == "heading":
+        return "#" * rng.randint(2, 6) + " " + __sentence(rng, 3, 8)
+    if kind == "unordered_list":
+        return "\n".join("* " + __inline_text(rng, pages, pages_per_dir, 1)
+                         for _ in range(rng.randint(2, 8)))
+    if kind == "ordered_list":
+        return "\n".join(f"{i}. " + __inline_text(rng, pages, pages_per_dir, 1)
+                         for i in range(1, rng.randint(3, 10)))
+    if kind == "code":
+        return "```\n" + "\n".join(__sentence(rng, 2, 10) for _ in range(rng.randint(2, 12))) + "\n```"
+    if kind == "quote":
+        return "\n".join("> " + __sentence(rng, 5, 15) for _ in range(rng.randint(1, 4)))
+    return __inline_text(rng, pages, pages_per_dir, rng.randint(2, 6))
+
+
+def __inline_text(rng, pages: int, pages_per_dir: int, sentences: int):
+    parts = []
+    for _ in range(sentences):
+        sentence = __sentence(rng, 6, 20).split(" ")
+        # markup opening a line would be read as a list marker
+        position = rng.randrange(1, len(sentence))
+        markup = rng.randrange(6)
+        if markup == 0:
+            sentence[position] = f"**{sentence[position]}**"
+        elif markup == 1:
+            sentence[position] = f"*{sentence[position]}*"
+        elif markup == 2:
+            sentence[position] = f"`{sentence[position]}`"
+        elif markup == 3:
+            target = rng.randrange(pages)
+            sentence[position] = (f"[{sentence[position]}]"
+                                  f"(/section{target // pages_per_dir}/page{target}.html)")
+        elif markup == 4:
+            sentence[position] = f"![{sentence[position]}](/images/rivendell.png)"
+        parts.append(" ".join(sentence) + ".")
+    return " ".join(parts)
+
+
+def __sentence(rng, min_words: int, max_words: int):
+    return " ".join(rng.choices(WORDS, k=rng.randint(min_words, max_words)))
+
+
+def parse_mix(text: str):
+    mix = {}
+    for item in text.split(","):
+        kind, weight = item.split("=")
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown block kind in mix: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def peak_rss_kb():
+    usage = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    if sys.platform == "darwin":
+        return usage // 1024
+    return usage
+
+
+@contextmanager
+def quiet_stdout():
+    # file descriptor level, so the page generation logs of pool workers go too
+    sys.stdout.flush()
+    saved_fd = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved_fd, 1)
+            os.close(saved_fd)
+
+
+def run_benchmarks(content_dir: str, template_path: str, work_dir: str, jobs: int):
+    results = {}
+    sources = []
+    for root, _, files in os.walk(content_dir):
+        for file in files:
+            sources.append(os.path.join(root, file))
+    sources.sort()
+
+    markdowns = []
+    for source in sources:
+        with open(source, 'r') as f:
+            markdowns.append(f.read().removesuffix("\n"))
+
+    start = time.perf_counter()
+    nodes = [markdown_to_html_node(markdown) for markdown in markdowns]
+    results["markdown_to_html_node"] = __stage(start, len(sources))
+
+    start = time.perf_counter()
+    for node in nodes:
+        node.to_html()
+    results["to_html"] = __stage(start, len(sources))
+    del nodes
+
+    template = load_template(template_path)
+    pages_dir = os.path.join(work_dir, "generate_page")
+    with quiet_stdout():
+        start = time.perf_counter()
+        for i, source in enumerate(sources):
+            dest_path = os.path.join(pages_dir, f"{i}.html")
+            generate_page(source, template, dest_path, page_url_path(dest_path, pages_dir))
+        results["generate_page"] = __stage(start, len(sources))
+
+    site_dir = os.path.join(work_dir, "site")
+    manifest_path = os.path.join(work_dir, "manifest.json")
+    with quiet_stdout():
+        start = time.perf_counter()
+        generate_pages_recursive(content_dir, template_path, site_dir, manifest_path, jobs=jobs)
+        results["generate_pages_recursive"] = __stage(start, len(sources))
+
+        start = time.perf_counter()
+        generate_pages_recursive(content_dir, template_path, site_dir, manifest_path, jobs=jobs)
+        results["generate_pages_recursive_unchanged"] = __stage(start, len(sources))
+
+    return results
+
+
+def __stage(start: float, pages: int):
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": round(seconds, 6),
+        "pages_per_sec": round(pages / seconds, 2) if seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark buzz on a synthetic content tree")
+    parser.add_argument("--pages", type=int, default=500, help="Number of pages to generate")
+    parser.add_argument("--blocks", type=int, default=40, help="Number of blocks per page")
+    parser.add_argument(
+        "--mix", type=parse_mix, default=DEFAULT_MIX,
+        help="Relative weights of block kinds, e.g. paragraph=6,code=1,quote=1",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Processes for full builds")
+    parser.add_argument("--template", type=str, default="./template.html")
+    parser.add_argument("--output", type=str, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="buzz-bench-")
+    try:
+        content_dir = os.path.join(work_dir, "content")
+        start = time.perf_counter()
+        generate_corpus(content_dir, args.pages, args.blocks, args.mix, seed=args.seed)
+        corpus_seconds = time.perf_counter() - start
+        corpus_bytes = sum(
+            os.path.getsize(os.path.join(root, file))
+            for root, _, files in os.walk(content_dir) for file in files
+        )
+
+        stages = run_benchmarks(content_dir, args.template, work_dir, args.jobs)
+    finally:
+        shutil.rmtree(work_dir)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {
+            "pages": args.pages,
+            "blocks_per_page": args.blocks,
+            "mix": args.mix,
+            "seed": args.seed,
+            "bytes": corpus_bytes,
+            "generation_seconds": round(corpus_seconds, 6),
+        },
+        "jobs": args.jobs,
+        "stages": stages,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
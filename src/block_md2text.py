@@ -1,8 +1,12 @@
 import re
+from time import perf_counter
 
 from leafnode import LeafNode
+from links import collect_links
 from parentnode import ParentNode
 from md2text import text_to_text_nodes
+from profiler import NULL_PROFILER
+from render_cache import MIN_BLOCK_LENGTH, block_key, document_key
 from textnode import text_node_to_html_node
 
 block_type_paragraph = "paragraph"
@@ -12,156 +16,282 @@ block_type_quote = "quote"
 block_type_unorderedlist = "unordered_list"
 block_type_orderedlist = "ordered_list"
 
-HEADING_RE = r"^#{1,6} "
-CODE_BLOCK = r"```"
-QUOTE_BLOCK_RE = r"^>"
-UNORDERED_LIST_RE = r"^[*-]"
-ORDERED_LIST_RE = r"^[1-9][0-9]*?\."
+HEADING_RE = re.compile(r"^(#{1,6}) ")
+CODE_BLOCK = re.compile(r"```")
+QUOTE_BLOCK_RE = re.compile(r"^>")
+UNORDERED_LIST_RE = re.compile(r"^[*-](.*)")
+ORDERED_LIST_RE = re.compile(r"^[1-9][0-9]*?\.(.*)")
+
+class Block():
+    __slots__ = ("text", "block_type", "lines", "start_line", "end_line")
+
+    def __init__(self, text: str, block_type: str, lines, start_line: int, end_line: int):
+        self.text = text
+        self.block_type = block_type
+        self.lines = lines
+        # 1-based and inclusive line numbers within the whole document
+        self.start_line = start_line
+        self.end_line = end_line
+
+
+    def __eq__(self, other):
+        return (
+            self.text == other.text and
+            self.block_type == other.block_type and
+            self.start_line == other.start_line and
+            self.end_line == other.end_line
+        )
+
+
+    def __repr__(self):
+        return f'Block("{self.block_type}", lines {self.start_line}-{self.end_line})'
+
 
 def markdown_to_blocks(mdtext):
     return mdtext.split("\n\n")
 
 
-def block_to_block_type(mdblock: str):
-    if re.match(HEADING_RE, mdblock):
-        return block_type_heading
-    if __is_block_type(block_type_code, mdblock):
-        return block_type_code
-    if __is_block_type(block_type_quote, mdblock):
-        return block_type_quote
-    if __is_block_type(block_type_unorderedlist, mdblock):
-        return block_type_unorderedlist
-    if __is_block_type(block_type_orderedlist, mdblock):
-        return block_type_orderedlist
+def lex_blocks(markdown: str):
+    blocks = []
+    line_number = 1
 
-    return block_type_paragraph
+    mdblocks = markdown_to_blocks(markdown)
+    if mdblocks[-1] == "":
+        mdblocks = mdblocks[:-1]
 
+    for mdblock in mdblocks:
+        lines = mdblock.split("\n")
+        end_line = line_number + len(lines) - 1
+        blocks.append(Block(mdblock, __classify_lines(lines), lines, line_number, end_line))
+        # the blank line separating two blocks is not part of either
+        line_number = end_line + 2
 
-def __is_block_type(block_type, mdblock):
-    if (block_type == block_type_heading
-            or block_type == block_type_paragraph):
-        return False
+    return blocks
 
-    lines = mdblock.split("\n")
-    if lines[-1] == "":
-        lines = lines[:-1]
 
-    if block_type == block_type_code:
-        if not (re.match(CODE_BLOCK, lines[0])
-            and re.match(CODE_BLOCK, lines[-1])):
-            return False
+def read_blocks(lines):
+    # lines may be a file object, the blocks come out one at a time and are the same
+    # as those of lex_blocks() once the trailing newline of the file is dropped
+    block_lines = []
+    start_line = 1
+    separator = False
 
-    if block_type == block_type_quote:
-        for line in lines:
-            if not re.match(QUOTE_BLOCK_RE, line):
-                return False
+    for line_number, line in enumerate(lines, 1):
+        line = line.removesuffix("\n")
+        if separator:
+            yield __make_block(block_lines, start_line)
+            block_lines = []
+            separator = False
 
-    if block_type == block_type_unorderedlist:
-        for line in lines:
-            if not re.match(UNORDERED_LIST_RE, line):
-                return False
+        if not block_lines:
+            # the newline before the first line of a block belongs to a separator
+            block_lines.append(line)
+            start_line = line_number
+        elif line == "":
+            # an empty line only separates blocks if another line follows it
+            separator = True
+        else:
+            block_lines.append(line)
 
-    if block_type == block_type_orderedlist:
-        for line in lines:
-            if not re.match(ORDERED_LIST_RE, line):
-                return False
+    if separator:
+        block_lines.append("")
+    if block_lines and block_lines != [""]:
+        yield __make_block(block_lines, start_line)
 
-    return True
 
+def __make_block(lines, start_line: int):
+    return Block("\n".join(lines), __classify_lines(lines), lines, start_line,
+                 start_line + len(lines) - 1)
 
-def markdown_to_html_node(markdown):
-    child_nodes = []
 
-    blocks = markdown_to_blocks(markdown)
-    if blocks[-1] == "":
-        blocks = blocks[:-1]
+def block_to_block_type(mdblock: str):
+    return __classify_lines(mdblock.split("\n"))
 
-    for block in blocks:
-        block_type = block_to_block_type(block)
-        child_nodes.append(__md_block_to_html_node(block, block_type))
-
-    return ParentNode("div", child_nodes)
-
-
-def __md_block_to_html_node(block: str, block_type: str):
-    if block_type == block_type_heading:
-        return __md_block_to_html_heading(block)
-    if block_type == block_type_quote:
-        return __md_block_to_html_quote(block)
-    if block_type == block_type_code:
-        return __md_block_to_html_code(block)
-    if block_type == block_type_unorderedlist:
-        return __md_block_to_html_list(block, "ul")
-    if block_type == block_type_orderedlist:
-        return __md_block_to_html_list(block, "ol")
-
-    return ParentNode("p", __text_nodes_to_html_nodes(
-        text_to_text_nodes(block)
-    ))
 
+def __classify_lines(lines):
+    first_line = lines[0]
+    if HEADING_RE.match(first_line):
+        return block_type_heading
 
-def __md_block_to_html_heading(block: str):
-    if block.startswith("# "):
-        return ParentNode("h1", __text_nodes_to_html_nodes(
-            text_to_text_nodes(block[2:])
-        ))
-    if block.startswith("## "):
-        return ParentNode("h2", __text_nodes_to_html_nodes(
-            text_to_text_nodes(block[3:])
-        ))
-    if block.startswith("### "):
-        return ParentNode("h3", __text_nodes_to_html_nodes(
-            text_to_text_nodes(block[4:])
-        ))
-    if block.startswith("#### "):
-        return ParentNode("h4", __text_nodes_to_html_nodes(
-            text_to_text_nodes(block[5:])
-        ))
-    if block.startswith("##### "):
-        return ParentNode("h5", __text_nodes_to_html_nodes(
-            text_to_text_nodes(block[6:])
-        ))
-
-    return ParentNode("h6", __text_nodes_to_html_nodes(
-        text_to_text_nodes(block[7:])
-    ))
+    if lines[-1] == "":
+        lines = lines[:-1]
+    if not lines:
+        return block_type_paragraph
 
+    # the first line leaves at most one candidate, the others only confirm it
+    if CODE_BLOCK.match(first_line):
+        if CODE_BLOCK.match(lines[-1]):
+            return block_type_code
+        return block_type_paragraph
 
-def __md_block_to_html_quote(block: str):
-    lines = __remove_blank_lines(block.split("\n"))
+    if first_line.startswith(">"):
+        if all(line.startswith(">") for line in lines):
+            return block_type_quote
+        return block_type_paragraph
+
+    if first_line.startswith(("*", "-")):
+        if all(line.startswith(("*", "-")) for line in lines):
+            return block_type_unorderedlist
+        return block_type_paragraph
+
+    if ORDERED_LIST_RE.match(first_line):
+        if all(ORDERED_LIST_RE.match(line) for line in lines):
+            return block_type_orderedlist
+
+    return block_type_paragraph
+
+
+def markdown_to_html_node(markdown, profiler=None, cache=None, memo=None):
+    # with a cache, the HTML comes back already rendered, as a raw leaf node
+    if cache is not None:
+        with (profiler or NULL_PROFILER).stage("cache"):
+            doc_key = document_key(markdown)
+            html = cache.get(doc_key)
+        if html is not None:
+            return LeafNode(None, html)
+
+    if profiler is None:
+        blocks = lex_blocks(markdown)
+    else:
+        start = perf_counter()
+        blocks = lex_blocks(markdown)
+        lexed = perf_counter()
+        profiler.add("blocks", lexed - start)
+        before = {stage: profiler.stages.get(stage, 0.0) for stage in ("inline", "cache", "memo")}
+
+    if cache is None and memo is None:
+        child_nodes = []
+        for block in blocks:
+            child_nodes.append(__md_block_to_html_node(block, profiler))
+        node = ParentNode("div", child_nodes)
+    else:
+        node = ParentNode("div", __reused_blocks_to_html_nodes(blocks, profiler, cache, memo))
+        if cache is not None:
+            node = LeafNode(None, node.to_html())
+
+    if profiler is not None:
+        # inline parsing, the cache and the memo are accounted for on their own,
+        # what is left is node building
+        accounted = sum(profiler.stages.get(stage, 0.0) - seconds
+                        for stage, seconds in before.items())
+        profiler.add("html", perf_counter() - lexed - accounted)
+
+    if cache is not None:
+        with (profiler or NULL_PROFILER).stage("cache"):
+            cache.put(doc_key, node.value)
+    return node
+
+
+def markdown_to_html_stream(blocks, write, memo=None, links=None):
+    # writes the HTML of markdown_to_html_node() block by block, without ever
+    # holding more than one block and its nodes
+    write("<div>")
+    empty = True
+    for block in blocks:
+        empty = False
+        if memo is None:
+            nodes = [__md_block_to_html_node(block)]
+        else:
+            nodes = __reused_blocks_to_html_nodes([block], None, None, memo)
+        for node in nodes:
+            if links is not None:
+                collect_links(node, links)
+            node.render_into(write)
+
+    if empty:
+        raise ValueError("A parent node must have at least one child node.")
+    write("</div>")
+
+
+def __reused_blocks_to_html_nodes(blocks, profiler, cache, memo):
+    timer = profiler or NULL_PROFILER
+    child_nodes = [None] * len(blocks)
+    if memo is not None:
+        with timer.stage("memo"):
+            for i, block in enumerate(blocks):
+                html = memo.get(block.text)
+                if html is not None:
+                    child_nodes[i] = LeafNode(None, html)
+
+    keys = [None] * len(blocks)
+    cached = {}
+    if cache is not None:
+        with timer.stage("cache"):
+            keys = [block_key(block.text)
+                    if node is None and len(block.text) >= MIN_BLOCK_LENGTH else None
+                    for block, node in zip(blocks, child_nodes)]
+            cached = cache.get_many(key for key in keys if key is not None)
+
+    rendered = {}
+    for i, (block, key) in enumerate(zip(blocks, keys)):
+        if child_nodes[i] is not None:
+            continue
+        if key in cached:
+            node = LeafNode(None, cached[key])
+        else:
+            node = __md_block_to_html_node(block, profiler)
+            if key is not None:
+                # rendered once, for the cache and the page alike
+                rendered[key] = node.to_html()
+                node = LeafNode(None, rendered[key])
+        if memo is not None:
+            node = memo.put(block.text, node)
+        child_nodes[i] = node
+
+    if cache is not None:
+        with timer.stage("cache"):
+            cache.put_many(rendered)
+    return child_nodes
+
+
+def __md_block_to_html_node(block: Block, profiler=None):
+    if block.block_type == block_type_heading:
+        return __md_block_to_html_heading(block.text, profiler)
+    if block.block_type == block_type_quote:
+        return __md_block_to_html_quote(block.lines, profiler)
+    if block.block_type == block_type_code:
+        return __md_block_to_html_code(block.lines)
+    if block.block_type == block_type_unorderedlist:
+        return __md_block_to_html_list(block.lines, "ul", profiler)
+    if block.block_type == block_type_orderedlist:
+        return __md_block_to_html_list(block.lines, "ol", profiler)
+
+    return ParentNode("p", __inline_to_html_nodes(block.text, profiler))
+
+
+def __md_block_to_html_heading(block: str, profiler=None):
+    level = len(HEADING_RE.match(block).group(1))
+    return ParentNode(f"h{level}", __inline_to_html_nodes(block[level + 1:], profiler))
+
+
+def __md_block_to_html_quote(lines, profiler=None):
+    lines = __remove_blank_lines(lines)
     lines_without_prefix = []
     for line in lines:
         lines_without_prefix.append(line.removeprefix(">"))
 
-    return ParentNode("blockquote", __text_nodes_to_html_nodes(
-        text_to_text_nodes("\n".join(lines_without_prefix))
+    return ParentNode("blockquote", __inline_to_html_nodes(
+        "\n".join(lines_without_prefix), profiler
     ))
 
 
-def __md_block_to_html_code(block: str):
-    lines = __remove_blank_lines(block.split("\n"))
+def __md_block_to_html_code(lines):
+    lines = __remove_blank_lines(lines)
 
     return ParentNode("code", [
         LeafNode("pre", "\n".join(lines[1:-1]))
     ])
 
 
-def __md_block_to_html_list(block: str, list_type: str):
+def __md_block_to_html_list(lines, list_type: str, profiler=None):
     html_list_items = []
-    lines = __remove_blank_lines(block.split("\n"))
-    pattern = ""
-
-    if list_type == "ol":
-        pattern = r"^[1-9][0-9]*?\.(.*)"
-    else:
-        pattern = r"^[*-](.*)"
+    lines = __remove_blank_lines(lines)
+    pattern = ORDERED_LIST_RE if list_type == "ol" else UNORDERED_LIST_RE
 
     for line in lines:
-        text = re.findall(pattern, line)[0].lstrip(" ")
+        text = pattern.match(line).group(1).lstrip(" ")
         html_list_items.append(
-            ParentNode("li", __text_nodes_to_html_nodes(
-                text_to_text_nodes(text)
-            ))
+            ParentNode("li", __inline_to_html_nodes(text, profiler))
         )
 
     return ParentNode(list_type, html_list_items)
@@ -175,9 +305,15 @@ def __remove_blank_lines(lines):
     return new_lines
 
 
-def __text_nodes_to_html_nodes(text_nodes):
+def __inline_to_html_nodes(text: str, profiler=None):
+    if profiler is None:
+        text_nodes = text_to_text_nodes(text)
+    else:
+        start = perf_counter()
+        text_nodes = text_to_text_nodes(text)
+        profiler.add("inline", perf_counter() - start)
+
     html_nodes = []
     for node in text_nodes:
         html_nodes.append(text_node_to_html_node(node))
     return html_nodes
-
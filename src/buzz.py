@@ -1,28 +1,36 @@
 import os.path
-import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from html import escape
+from time import perf_counter
 
-from block_md2text import markdown_to_html_node
+from block_md2text import (
+    block_to_block_type,
+    block_type_paragraph,
+    markdown_to_blocks,
+    markdown_to_html_node,
+    markdown_to_html_stream,
+    read_blocks,
+)
+from links import collect_links
+from manifest import BuildManifest, hash_bytes, hash_file, stat_and_hash
+from md2text import text_to_text_nodes
+from output import OutputWriter
+from profiler import NULL_PROFILER, BuildProfiler, TimedCalls
+from search import PageIndexer
+from template import Template, load_template
 
-def copy_dir_recursively(src: str, dst: str):
-    if not os.path.exists(src):
-        raise FileNotFoundError(f"Source directory does not exist: {src}")
+# larger pages are parsed and rendered block by block, straight from their file
+STREAM_MIN_SIZE = 8 << 20
 
-    if not os.path.exists(dst):
-        os.mkdir(dst)
-
-    if os.listdir(dst):
-        shutil.rmtree(dst)
-        os.mkdir(dst)
-
-    src_files = os.listdir(src)
-    for file in src_files:
-        src_file_path = os.path.join(src, file)
-        dst_file_path = os.path.join(dst, file)
-        if os.path.isdir(src_file_path):
-            copy_dir_recursively(src_file_path, dst_file_path)
-        else:
-            shutil.copy(src_file_path, dst)
+# what the page jobs of a pool worker share, set once when the worker starts
+WORKER_CONTEXT = {}
 
+class BuildError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        details = "\n".join(f"  {path}: {error}" for path, error in errors)
+        super().__init__(f"{len(errors)} page(s) failed to build:\n{details}")
 
 def extract_title(markdown: str):
     lines = markdown.split('\n')
@@ -33,41 +41,145 @@ def extract_title(markdown: str):
     raise ValueError("No h1 header found. At least one h1 header must be present.")
 
 
-def generate_page(from_path: str, template_path: str, dest_path: str):
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}...")
+def extract_description(markdown: str, max_length=160):
+    for block in markdown_to_blocks(markdown):
+        if block_to_block_type(block) != block_type_paragraph:
+            continue
+        return __paragraph_description(block, max_length)
+    return ""
+
 
-    markdown = ''
+def scan_metadata(from_path: str, max_length=160):
+    # what extract_title and extract_description find, read one block at a time
+    title = None
+    description = None
     with open(from_path, 'r') as f:
-        markdown = f.read()
-    if markdown[-1] == '\n':
-        markdown = markdown[:-1]
+        for block in read_blocks(f):
+            if description is None and block.block_type == block_type_paragraph:
+                description = __paragraph_description(block.text, max_length)
+            if title is None:
+                title = next((line[2:] for line in block.lines if line.startswith("# ")), None)
+            if title is not None and description is not None:
+                break
+
+    if title is None:
+        raise ValueError("No h1 header found. At least one h1 header must be present.")
+    return title, description or ""
+
+
+def __paragraph_description(block: str, max_length: int):
+    text = "".join(node.text for node in text_to_text_nodes(block))
+    text = " ".join(text.split())
+    if len(text) > max_length:
+        text = text[:max_length].rsplit(" ", 1)[0] + "..."
+    return text
+
+
+class StreamedContent():
+    __slots__ = ("path", "memo", "links")
+
+    def __init__(self, path: str, memo=None, links=None):
+        self.path = path
+        self.memo = memo
+        self.links = links
 
-    template_html = ''
-    with open(template_path, 'r') as t:
-        template_html = t.read()
 
-    content = markdown_to_html_node(markdown).to_html()
-    title = extract_title(markdown)
+    def render_into(self, write):
+        with open(self.path, 'r') as f:
+            markdown_to_html_stream(read_blocks(f), write, self.memo, self.links)
 
-    withtitle = template_html.replace("{{ Title }}", title)
-    htmlpage = withtitle.replace("{{ Content }}", content)
 
-    opdir = os.path.dirname(dest_path)
-    if not os.path.exists(opdir):
-        os.makedirs(opdir)
+def page_url_path(dest_path: str, dest_dir_path: str):
+    rel_path = os.path.relpath(dest_path, dest_dir_path).replace(os.sep, "/")
+    if rel_path == ".":
+        rel_path = os.path.basename(dest_path)
+    if rel_path == "index.html":
+        return "/"
+    if rel_path.endswith("/index.html"):
+        return "/" + rel_path.removesuffix("index.html")
+    return "/" + rel_path
 
-    output = open(dest_path, 'w')
-    output.write(htmlpage)
-    output.flush()
-    output.close()
 
+def generate_page(from_path: str, template, dest_path: str, url_path=None, profiler=None,
+                  cache=None, memo=None, links=None, images=None, search=None, output=None,
+                  image_refs=None):
+    timer = profiler or NULL_PROFILER
+    if not isinstance(template, Template):
+        template = load_template(template)
+    print(f"Generating page from {from_path} to {dest_path} using {template.path}...")
+    timer.start_page(from_path)
 
-def generate_pages_recursive(dir_path_content: str, template_path: str, dest_dir_path: str):
+    if os.path.getsize(from_path) >= STREAM_MIN_SIZE:
+        # the file is read twice instead of held in memory, parsing happens while rendering
+        with timer.stage("metadata"):
+            title, description = scan_metadata(from_path)
+        content = StreamedContent(from_path, memo, links)
+    else:
+        markdown = ''
+        with timer.stage("read"):
+            with open(from_path, 'r') as f:
+                markdown = f.read()
+            if markdown[-1] == '\n':
+                markdown = markdown[:-1]
+
+        content = markdown_to_html_node(markdown, profiler, cache, memo)
+        with timer.stage("metadata"):
+            title = extract_title(markdown)
+            description = extract_description(markdown)
+        if links is not None:
+            with timer.stage("links"):
+                collect_links(content, links)
+
+    values = {
+        "Title": title,
+        "Content": content,
+        "Date": date.fromtimestamp(os.path.getmtime(from_path)).isoformat(),
+        "Description": escape(description),
+        "Path": url_path,
+    }
+
+    # the page is rendered straight into its output, which only replaces the file once whole
+    if output is None:
+        output = OutputWriter()
+    page = output.open(dest_path)
+    write = page.write
+    if profiler is not None:
+        write = timed = TimedCalls(page.write)
+    if images is not None:
+        # after the caches, which keep the HTML as the markdown renders it
+        write = images.rewriter(write, url_path or "/", image_refs)
+    if search is not None:
+        # the words of the page are taken from its HTML on the way to the file
+        search.title = title
+        write = search.tee(write)
+    start = perf_counter()
+    try:
+        template.render_into(write, values)
+        if search is not None:
+            search.close()
+        rendered = perf_counter()
+        page.commit()
+    except Exception:
+        page.abort()
+        raise
+
+    if profiler is not None:
+        # rendering and writing are interleaved, so they are told apart afterwards
+        written = perf_counter()
+        indexing = search.seconds if search is not None else 0.0
+        profiler.add("write", timed.seconds + written - rendered)
+        if search is not None:
+            profiler.add("search", indexing)
+        profiler.add("render", rendered - start - timed.seconds - indexing)
+    timer.end_page()
+
+
+def find_pages(dir_path_content: str, dest_dir_path: str):
     if os.path.isfile(dir_path_content):
-        generate_page(dir_path_content, template_path, dest_dir_path)
-        return
+        return [(dir_path_content, dest_dir_path)]
 
-    files = os.listdir(dir_path_content)
+    pages = []
+    files = sorted(os.listdir(dir_path_content))
     for file in files:
         destfile = file
         if file.endswith(".md"):
@@ -75,5 +187,173 @@ def generate_pages_recursive(dir_path_content: str, template_path: str, dest_dir
             destfile = destfile + ".html"
         new_dir_path = os.path.join(dir_path_content, file)
         new_dest_path = os.path.join(dest_dir_path, destfile)
-        generate_pages_recursive(new_dir_path, template_path, new_dest_path)
+        pages.extend(find_pages(new_dir_path, new_dest_path))
+    return pages
+
+
+def generate_pages_recursive(dir_path_content: str, template_path: str, dest_dir_path: str,
+                             manifest_path=None, jobs=1, profiler=None, cache=None, memo=None,
+                             link_index=None, images=None, search_index=None, output=None):
+    timer = profiler or NULL_PROFILER
+    with timer.stage("discover"):
+        pages = find_pages(dir_path_content, dest_dir_path)
+
+    manifest = None
+    sources = {}
+    if manifest_path is not None:
+        with timer.stage("manifest"):
+            manifest = BuildManifest.load(manifest_path)
+            template_hash = hash_file(template_path)
+            if images is not None:
+                # pages are rewritten by the image stage, which pages built without it were not
+                template_hash = hash_bytes(f"{template_hash}:images".encode())
+            manifest.set_template(template_hash)
+            stale_pages = []
+            for from_path, dest_path in pages:
+                if (not manifest.is_stale(from_path, dest_path)
+                        and __images_are_current(manifest, from_path, images)
+                        and __restore_page(manifest, from_path,
+                                           page_url_path(dest_path, dest_dir_path),
+                                           link_index, search_index)):
+                    continue
+                # taken before generating so an edit made mid-build is picked up next time
+                sources[from_path] = stat_and_hash(from_path)
+                stale_pages.append((from_path, dest_path))
+    else:
+        stale_pages = pages
+
+    if output is None:
+        output = OutputWriter(dest_dir_path)
+    errors = []
+    with timer.stage("template"):
+        template = load_template(template_path)
+    results = __generate_pages(stale_pages, template, dest_dir_path, jobs, profiler is not None,
+                               cache, memo, link_index is not None, images,
+                               search_index is not None, output)
+    for (from_path, dest_path), result in zip(stale_pages, results):
+        error, profile, cached, memoized, links, document, outputs, image_refs = result
+        if profile is not None:
+            profiler.merge(profile)
+        if cached is not None:
+            cache.merge(cached)
+        if memoized is not None:
+            memo.merge_stats(memoized)
+        output.merge_stats(outputs)
+        if error is not None:
+            errors.append((from_path, error))
+            continue
+        if links is not None:
+            link_index.add(page_url_path(dest_path, dest_dir_path), links)
+        document_hash = None
+        if document is not None:
+            document, seconds = document
+            search_index.add(page_url_path(dest_path, dest_dir_path), document, seconds)
+            if manifest is not None:
+                document_hash = search_index.store_document(document)
+        if manifest is not None:
+            stat, content_hash = sources[from_path]
+            manifest.record(from_path, dest_path, content_hash, links, document_hash, stat,
+                            image_refs)
+
+    if manifest is not None:
+        with timer.stage("manifest"):
+            for output_path in manifest.remove_missing(from_path for from_path, _ in pages):
+                remove_output(output_path, dest_dir_path)
+            manifest.save()
+            if search_index is not None:
+                search_index.prune_store(manifest.page_search_documents())
+
+    if errors:
+        raise BuildError(errors)
+
+
+def __generate_pages(pages, template: Template, dest_dir_path: str, jobs: int, profile: bool,
+                     cache=None, memo=None, with_links=False, images=None, with_search=False,
+                     output=None):
+    jobs = min(jobs or os.cpu_count() or 1, len(pages))
+    # what every page shares, the template and the images in particular, is handed to
+    # each pool worker once instead of with every page
+    context = (template, profile, cache, memo, with_links, images, with_search, output)
+    page_jobs = [(from_path, dest_path, page_url_path(dest_path, dest_dir_path))
+                 for from_path, dest_path in pages]
+
+    if jobs <= 1:
+        return [__generate_page_job(job, context) for job in page_jobs]
+
+    # results come back in submission order, which keeps the build deterministic
+    chunksize = max(1, len(page_jobs) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=__set_worker_context,
+                             initargs=(context,)) as executor:
+        return list(executor.map(__generate_page_job, page_jobs, chunksize=chunksize))
+
+
+def __set_worker_context(context):
+    WORKER_CONTEXT["page"] = context
+
+
+def __generate_page_job(job, context=None):
+    from_path, dest_path, url_path = job
+    (template, profile, cache, memo, with_links, images, with_search,
+     output) = context or WORKER_CONTEXT["page"]
+    # every job profiles on its own, pool workers send their timings back
+    profiler = BuildProfiler() if profile else None
+    links = [] if with_links else None
+    search = PageIndexer() if with_search else None
+    image_refs = {} if images is not None else None
+    error = None
+    try:
+        generate_page(from_path, template, dest_path, url_path, profiler, cache, memo, links,
+                      images, search, output, image_refs)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    document = None
+    if search is not None and error is None:
+        document = (search.to_document(), search.seconds)
+    # pool workers only read the cache, its writes are left to the main process
+    return (error, profiler.to_dict() if profiler else None,
+            cache.take_pending() if cache is not None else None,
+            memo.take_stats() if memo is not None else None,
+            links, document, output.take_stats(), image_refs)
+
+
+def __images_are_current(manifest, from_path: str, images=None):
+    # a page is rebuilt when an image it references changed, not when any image did
+    if images is None:
+        return True
+    references = manifest.page_images(from_path)
+    return references is not None and images.is_current(references)
+
+
+def __restore_page(manifest, from_path: str, url_path: str, link_index=None, search_index=None):
+    # what an unchanged page adds to the indexes comes from the last build, a page
+    # last built without it is built again
+    links = None
+    if link_index is not None:
+        links = manifest.page_links(from_path)
+        if links is None:
+            return False
+    document = None
+    if search_index is not None:
+        document = search_index.load_document(manifest.page_search_document(from_path))
+        if document is None:
+            return False
+
+    if links is not None:
+        link_index.add(url_path, links)
+    if document is not None:
+        search_index.add(url_path, document)
+    return True
+
+
+def remove_output(output_path: str, dest_dir_path: str):
+    print(f"Removing {output_path}, its source no longer exists...")
+    if os.path.exists(output_path):
+        os.remove(output_path)
 
+    # prune directories left empty, but never the destination root itself
+    root = os.path.abspath(dest_dir_path)
+    opdir = os.path.dirname(os.path.abspath(output_path))
+    while (opdir.startswith(root + os.sep) and os.path.isdir(opdir)
+           and not os.listdir(opdir)):
+        os.rmdir(opdir)
+        opdir = os.path.dirname(opdir)
@@ -0,0 +1,191 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from assets import walk_files
+from manifest import hash_bytes, hash_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+encoding_gzip = "gzip"
+encoding_brotli = "br"
+
+SUFFIXES = {encoding_gzip: ".gz", encoding_brotli: ".br"}
+
+# images, fonts and archives are compressed already, they would not shrink
+COMPRESSIBLE_EXTENSIONS = (
+    ".html", ".htm", ".css", ".js", ".mjs", ".json", ".xml", ".svg", ".txt", ".md",
+    ".map", ".csv", ".wasm", ".ttf", ".otf", ".ico",
+)
+
+# below this, the headers of a response outweigh what compression saves
+MIN_SIZE = 256
+
+class CompressStats():
+    def __init__(self):
+        self.compressed = 0
+        self.skipped = 0
+        self.removed = 0
+        self.bytes_in = 0
+        self.bytes_out = {}
+        self.seconds = 0.0
+
+
+    def ratio(self, encoding: str):
+        return self.bytes_out.get(encoding, 0) / self.bytes_in if self.bytes_in else 0.0
+
+
+    def __repr__(self):
+        return (f"CompressStats(compressed = {self.compressed}, skipped = {self.skipped}, "
+                f"removed = {self.removed}, bytes_in = {self.bytes_in}, "
+                f"bytes_out = {self.bytes_out}, seconds = {self.seconds:.3f})")
+
+
+def available_encodings():
+    if brotli is None:
+        return (encoding_gzip,)
+    return (encoding_gzip, encoding_brotli)
+
+
+def is_compressible(path: str):
+    return path.endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def compress_dir(root: str, manifest=None, encodings=None, workers=1):
+    if encodings is None:
+        encodings = available_encodings()
+    for encoding in encodings:
+        if encoding not in SUFFIXES:
+            raise ValueError(f"Invalid encoding {encoding}")
+        if encoding == encoding_brotli and brotli is None:
+            raise ValueError("Brotli compression needs the brotli package")
+
+    start = perf_counter()
+    stats = CompressStats()
+    # without a manifest, siblings carrying the mtime of their original are up to date
+    compressed = manifest.compressed if manifest is not None else {}
+    seen = set()
+    jobs = []
+
+    for rel_path, path, stat in walk_files(root):
+        if not is_compressible(path) or stat.st_size < MIN_SIZE:
+            continue
+        seen.add(rel_path)
+        entry = compressed.get(rel_path)
+        if __is_unchanged(entry, path, stat, encodings, manifest is not None):
+            stats.skipped += 1
+            continue
+        jobs.append((rel_path, path, stat, encodings))
+
+    if workers <= 1 or len(jobs) <= 1:
+        results = [__compress_job(job) for job in jobs]
+    else:
+        # zlib and brotli release the GIL while they compress
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(__compress_job, jobs))
+
+    for (rel_path, _, stat, _), (content_hash, written) in zip(jobs, results):
+        stats.compressed += 1
+        stats.bytes_in += stat.st_size
+        for encoding in encodings:
+            # a sibling left out is as large as the original
+            size = written.get(encoding, stat.st_size)
+            stats.bytes_out[encoding] = stats.bytes_out.get(encoding, 0) + size
+        if manifest is not None:
+            compressed[rel_path] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": content_hash,
+                "tried": list(encodings),
+                "encodings": sorted(written),
+            }
+
+    for rel_path in sorted(set(compressed) - seen):
+        stats.removed += __remove_siblings(root, rel_path, compressed.pop(rel_path))
+
+    stats.seconds = perf_counter() - start
+    return stats
+
+
+def remove_compressed(root: str, manifest):
+    # siblings left from an earlier build would be served in place of newer pages
+    removed = 0
+    for rel_path in sorted(manifest.compressed):
+        removed += __remove_siblings(root, rel_path, manifest.compressed.pop(rel_path))
+    return removed
+
+
+def compress_bytes(data: bytes, encoding: str):
+    if encoding == encoding_gzip:
+        # a fixed mtime keeps the output identical across builds
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == encoding_brotli:
+        return brotli.compress(data, quality=11)
+    raise ValueError(f"Invalid encoding {encoding}")
+
+
+def __compress_job(job):
+    _, path, stat, encodings = job
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    written = {}
+    for encoding in encodings:
+        sibling = path + SUFFIXES[encoding]
+        body = compress_bytes(data, encoding)
+        if len(body) >= len(data):
+            # serving the original is cheaper than decompressing a larger body
+            if os.path.exists(sibling):
+                os.remove(sibling)
+            continue
+
+        tmp_path = sibling + ".buzz-tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, sibling)
+        written[encoding] = len(body)
+
+    return hash_bytes(data), written
+
+
+def __remove_siblings(root: str, rel_path: str, entry: dict):
+    removed = 0
+    for encoding in entry["encodings"]:
+        sibling = os.path.join(root, rel_path) + SUFFIXES[encoding]
+        if os.path.exists(sibling):
+            os.remove(sibling)
+            removed += 1
+    return removed
+
+
+def __is_unchanged(entry, path: str, stat, encodings, has_manifest: bool):
+    if not has_manifest:
+        for encoding in encodings:
+            try:
+                sibling_stat = os.stat(path + SUFFIXES[encoding])
+            except FileNotFoundError:
+                return False
+            if sibling_stat.st_mtime_ns != stat.st_mtime_ns:
+                return False
+        return True
+
+    if entry is None or entry["tried"] != list(encodings):
+        return False
+    # encodings that did not shrink the file were left out on purpose
+    for encoding in entry["encodings"]:
+        if not os.path.exists(path + SUFFIXES[encoding]):
+            return False
+    if entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        return True
+
+    # pages are rewritten on every build, the content hash decides
+    if hash_file(path) != entry["hash"]:
+        return False
+    entry["mtime_ns"] = stat.st_mtime_ns
+    entry["size"] = stat.st_size
+    return True
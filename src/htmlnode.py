@@ -1,4 +1,7 @@
 class HTMLNode():
+    # slots keep the many short-lived nodes of a page free of a __dict__
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
@@ -7,18 +10,21 @@ class HTMLNode():
 
 
     def to_html(self):
+        parts = []
+        self.render_into(parts.append)
+        return "".join(parts)
+
+
+    def render_into(self, write):
+        # write is called with successive fragments of the HTML, e.g. file.write
         raise NotImplementedError()
 
 
     def props_to_html(self):
-        html_attrs = ""
-
         if not self.props:
-            return html_attrs
+            return ""
 
-        for prop in self.props:
-            html_attrs += f' {prop}="{self.props[prop]}"'
-        return html_attrs
+        return "".join(f' {prop}="{value}"' for prop, value in self.props.items())
 
 
     def __repr__(self):
@@ -28,4 +34,3 @@ class HTMLNode():
             children = {self.children},
             props = {self.props}
         )"""
-
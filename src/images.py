@@ -0,0 +1,360 @@
+import json
+import os
+import posixpath
+import re
+import struct
+import tempfile
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from assets import copy_file
+from links import resolve_target
+from manifest import hash_bytes, hash_file
+from render_cache import CACHE_DIR
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# formats whose dimensions are read from their header
+IMAGE_EXTENSIONS = (".png", ".gif", ".jpg", ".jpeg", ".webp")
+
+# formats downscaled variants are made of, animated GIFs would lose their frames
+VARIANT_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# JPEG markers of a start of frame, the one holding the dimensions
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# images as the markdown renderer writes them, attributes added by hand are left alone
+IMG_TAG_RE = re.compile(r'<img src="([^"]*)"([^>]*)>')
+
+class ImageStats():
+    def __init__(self):
+        self.images = 0
+        self.processed = 0
+        self.skipped = 0
+        self.variants = 0
+        self.resized = 0
+        self.removed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+
+    def ratio(self):
+        # size of the smallest variants relative to their originals
+        return self.bytes_out / self.bytes_in if self.bytes_in else 0.0
+
+
+    def __repr__(self):
+        return (f"ImageStats(images = {self.images}, processed = {self.processed}, "
+                f"skipped = {self.skipped}, variants = {self.variants}, "
+                f"resized = {self.resized}, removed = {self.removed}, "
+                f"seconds = {self.seconds:.3f})")
+
+
+def is_image(path: str):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def can_make_variants():
+    return Image is not None
+
+
+def image_size(f):
+    # (width, height) read from the header of an open binary file, None if unknown
+    head = f.read(32)
+    if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", head[6:10])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _webp_size(head)
+    if head[:2] == b"\xff\xd8":
+        f.seek(2)
+        return _jpeg_size(f)
+    return None
+
+
+def _webp_size(head: bytes):
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        b0, b1, b2, b3 = head[21:25]
+        return (1 + (((b1 & 0x3F) << 8) | b0),
+                1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6)))
+    if chunk == b"VP8X":
+        return (1 + int.from_bytes(head[24:27], "little"),
+                1 + int.from_bytes(head[27:30], "little"))
+    return None
+
+
+def _jpeg_size(f):
+    # walks the segments up to the frame header, metadata segments are skipped over
+    while True:
+        if f.read(1) != b"\xff":
+            return None
+        marker = f.read(1)
+        while marker == b"\xff":
+            # markers may be padded with fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            # standalone markers have no length
+            continue
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        length = struct.unpack(">H", length)[0]
+        if marker in JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def variant_name(rel_path: str, width: int):
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}-{width}w{ext}"
+
+
+class ImagePipeline():
+    def __init__(self, static_dir: str, dest_dir: str, widths=(), cache_dir=CACHE_DIR):
+        self.static_dir = static_dir
+        self.dest_dir = dest_dir
+        # without Pillow, no variant is made and none is recorded as made
+        self.widths = sorted(set(widths)) if Image is not None else []
+        self.cache_dir = os.path.join(cache_dir, "images")
+        # site path -> (width, height, [(variant file name, width)]), filled by prepare()
+        self.images = {}
+
+
+    def prepare(self, manifest=None, workers=1):
+        # reads the dimensions of every static image and puts its variants next to it,
+        # images whose file did not change since the last build are not read again
+        start = perf_counter()
+        stats = ImageStats()
+        entries = manifest.images if manifest is not None else {}
+        seen = set()
+        jobs = []
+        for rel_path, src_path, stat in _walk_images(self.static_dir):
+            seen.add(rel_path)
+            entry = entries.get(rel_path)
+            if self._is_unchanged(entry, stat):
+                stats.skipped += 1
+                continue
+            jobs.append((rel_path, src_path, stat))
+
+        if workers <= 1 or len(jobs) <= 1:
+            results = [self._process(job) for job in jobs]
+        else:
+            # decoding and encoding release the GIL
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self._process, jobs))
+
+        for (rel_path, _, _), (entry, resized) in zip(jobs, results):
+            old = entries.get(rel_path)
+            kept = {name for name, _ in entry["variants"]}
+            for name, _ in old["variants"] if old is not None else ():
+                if name not in kept:
+                    stats.removed += _remove_variant(self.dest_dir, name)
+            entries[rel_path] = entry
+            stats.processed += 1
+            stats.resized += resized
+
+        for rel_path in sorted(set(entries) - seen):
+            for name, _ in entries.pop(rel_path)["variants"]:
+                stats.removed += _remove_variant(self.dest_dir, name)
+
+        self.images = {}
+        for rel_path, entry in entries.items():
+            if entry["width"] is None:
+                continue
+            site_path = "/" + rel_path.replace(os.sep, "/")
+            variants = [(posixpath.basename(name.replace(os.sep, "/")), width)
+                        for name, width in entry["variants"]]
+            self.images[site_path] = (entry["width"], entry["height"], variants)
+            stats.images += 1
+            stats.variants += len(variants)
+            if variants:
+                stats.bytes_in += entry["size"]
+                stats.bytes_out += entry["smallest"]
+
+        self._prune_cache(entry["hash"] for entry in entries.values())
+        stats.seconds = perf_counter() - start
+        return stats
+
+
+    def reference(self, site_path: str):
+        # what a page embeds of an image, None for an image that is not known
+        info = self.images.get(site_path)
+        if info is None:
+            return None
+        return hash_bytes(json.dumps(info).encode())[:16]
+
+
+    def is_current(self, references: dict):
+        # whether the images a page was built with are still the same
+        return all(self.reference(site_path) == reference
+                   for site_path, reference in references.items())
+
+
+    def rewriter(self, write, page="/", references=None):
+        # wraps write to add dimensions, lazy loading and variants to the images of page,
+        # every <img> tag reaches write whole so the HTML fragments are rewritten one by one;
+        # the images looked up are added to references, the page is rebuilt when they change
+        def rewrite(html):
+            if "<img " in html:
+                html = IMG_TAG_RE.sub(lambda match: self._img_tag(match, page, references),
+                                      html)
+            write(html)
+        return rewrite
+
+
+    def _img_tag(self, match, page: str, references=None):
+        src, attrs = match.groups()
+        if " width=" in attrs or " loading=" in attrs:
+            return match.group(0)
+        site_path = resolve_target(page, src)
+        if site_path is None:
+            return match.group(0)
+        if references is not None:
+            references[site_path] = self.reference(site_path)
+        info = self.images.get(site_path)
+        if info is None:
+            return match.group(0)
+
+        width, height, variants = info
+        attrs += f' width="{width}" height="{height}" loading="lazy" decoding="async"'
+        if variants:
+            srcset = ", ".join([f"{_variant_url(src, name)} {variant_width}w"
+                                for name, variant_width in variants] + [f"{src} {width}w"])
+            attrs += f' srcset="{srcset}" sizes="(max-width: {width}px) 100vw, {width}px"'
+        return f'<img src="{src}"{attrs}>'
+
+
+    def _is_unchanged(self, entry, stat):
+        if entry is None:
+            return False
+        if entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            return False
+        if entry["widths"] != self.widths:
+            return False
+        return all(os.path.exists(os.path.join(self.dest_dir, name))
+                   for name, _ in entry["variants"])
+
+
+    def _process(self, job):
+        rel_path, src_path, stat = job
+        entry = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": hash_file(src_path),
+            "widths": self.widths,
+            "width": None,
+            "height": None,
+            "variants": [],
+            "smallest": stat.st_size,
+        }
+        with open(src_path, 'rb') as f:
+            size = image_size(f)
+        if size is None:
+            print(f"Could not read the dimensions of {src_path}, leaving it as it is...")
+            return entry, 0
+        entry["width"], entry["height"] = size
+
+        resized = 0
+        ext = os.path.splitext(rel_path)[1].lower()
+        if Image is None or ext not in VARIANT_EXTENSIONS:
+            return entry, resized
+        for width in self.widths:
+            if width >= entry["width"]:
+                break
+            # variants are cached by the hash of their source, moving or touching an image
+            # does not make them again
+            cache_path = os.path.join(self.cache_dir, f"{entry['hash']}-{width}w{ext}")
+            if not os.path.exists(cache_path):
+                _resize(src_path, cache_path, width, entry["width"], entry["height"])
+                resized += 1
+            variant_size = os.path.getsize(cache_path)
+            if variant_size >= stat.st_size:
+                continue
+            name = variant_name(rel_path, width)
+            dest_path = os.path.join(self.dest_dir, name)
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            copy_file(cache_path, dest_path)
+            entry["variants"].append([name, width])
+            entry["smallest"] = min(entry["smallest"], variant_size)
+        return entry, resized
+
+
+    def _prune_cache(self, hashes):
+        if not os.path.isdir(self.cache_dir):
+            return
+        hashes = set(hashes)
+        for name in os.listdir(self.cache_dir):
+            if name.split("-", 1)[0] not in hashes:
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+def remove_variants(root: str, manifest):
+    # the variants of an earlier build made with images enabled
+    removed = 0
+    for entry in manifest.images.values():
+        for name, _ in entry["variants"]:
+            removed += _remove_variant(root, name)
+    manifest.images = {}
+    return removed
+
+
+def _walk_images(root: str):
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if not is_image(file_name):
+                continue
+            src_path = os.path.join(dir_path, file_name)
+            yield os.path.relpath(src_path, root), src_path, os.stat(src_path)
+
+
+def _resize(src_path: str, cache_path: str, width: int, src_width: int, src_height: int):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    height = max(1, round(src_height * width / src_width))
+    with Image.open(src_path) as image:
+        image_format = image.format
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+    options = {"optimize": True}
+    if image_format in ("JPEG", "WEBP"):
+        options["quality"] = 82
+    # copies of an image share their cache path, and may be resized by two threads at once
+    fd, tmp_path = tempfile.mkstemp(".tmp", os.path.basename(cache_path) + ".",
+                                    os.path.dirname(cache_path))
+    os.close(fd)
+    try:
+        resized.save(tmp_path, format=image_format, **options)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _variant_url(src: str, name: str):
+    parts = urllib.parse.urlsplit(src)
+    directory = parts.path.rsplit("/", 1)[0] + "/" if "/" in parts.path else ""
+    return urllib.parse.urlunsplit(parts._replace(path=directory + urllib.parse.quote(name)))
+
+
+def _remove_variant(root: str, name: str):
+    path = os.path.join(root, name)
+    if not os.path.exists(path):
+        return 0
+    os.remove(path)
+    return 1
@@ -1,24 +1,24 @@
 from htmlnode import HTMLNode
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag=None, value=None, props=None):
-        self.tag = tag
-        self.value = value
-        self.props = props
-        super().__init__(tag, value, props=props)
+        super().__init__(tag, value, None, props)
 
 
-    def to_html(self):
+    def render_into(self, write):
         # values are allowed to be empty strings
         if self.value is None:
             raise ValueError("A value is required for HTML leaf node")
 
         if not self.tag:
-            return str(self.value)
+            write(str(self.value))
+            return
 
-        html_attrs = super().props_to_html()
+        html_attrs = self.props_to_html()
 
-        return f"<{self.tag}{html_attrs}>{self.value.strip(' \n\t')}</{self.tag}>"
+        write(f"<{self.tag}{html_attrs}>{self.value.strip(' \n\t')}</{self.tag}>")
 
 
     def __repr__(self):
@@ -0,0 +1,130 @@
+import json
+import os
+import posixpath
+import re
+import urllib.parse
+
+from leafnode import LeafNode
+from textnode import text_type_image, text_type_link
+
+# targets in HTML rendered earlier, which comes back from the caches as raw text
+HTML_LINK_RE = re.compile(r'<(a|img) (?:href|src)="([^"]*)"')
+
+def collect_links(node, links: list):
+    # appends (kind, target) for every link and image below node, in document order
+    if isinstance(node, LeafNode):
+        if node.tag == "a":
+            links.append((text_type_link, node.props["href"]))
+        elif node.tag == "img":
+            links.append((text_type_image, node.props["src"]))
+        elif node.tag is None and "<" in node.value:
+            collect_html_links(node.value, links)
+        return
+    for child in node.children or ():
+        collect_links(child, links)
+
+
+def collect_html_links(html: str, links: list):
+    for tag, target in HTML_LINK_RE.findall(html):
+        links.append((text_type_link if tag == "a" else text_type_image, target))
+
+
+def resolve_target(page: str, target: str):
+    # the site path an internal target points to, None for external ones
+    parts = urllib.parse.urlsplit(target)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = urllib.parse.unquote(parts.path)
+    if not path.startswith("/"):
+        # relative to the directory of the page, which is the page itself for /dir/
+        path = posixpath.join(page if page.endswith("/") else posixpath.dirname(page), path)
+    resolved = posixpath.normpath(path)
+    if path.endswith("/") and resolved != "/":
+        resolved += "/"
+    return resolved
+
+
+class LinkIndex():
+    def __init__(self):
+        # page URL path -> [(kind, target)], as written in the page
+        self.outgoing = {}
+        # resolved site path -> set of the pages linking to it
+        self.incoming = {}
+
+
+    def add(self, page: str, links):
+        self.outgoing[page] = [tuple(link) for link in links]
+        for _, target in self.outgoing[page]:
+            path = resolve_target(page, target)
+            if path is not None:
+                self.incoming.setdefault(path, set()).add(page)
+
+
+    def validate(self, *roots):
+        # internal targets found as a file, or a directory index, under none of the roots
+        broken = []
+        exists = {}
+        for page in sorted(self.outgoing):
+            for kind, target in self.outgoing[page]:
+                path = resolve_target(page, target)
+                if path is None:
+                    continue
+                if path not in exists:
+                    exists[path] = any(_site_path_exists(root, path) for root in roots)
+                if not exists[path]:
+                    broken.append((page, kind, target))
+        return broken
+
+
+    def orphans(self):
+        # pages no other page links to, the home page excepted
+        linked = set()
+        for path, referrers in self.incoming.items():
+            key = _page_key(path)
+            if any(_page_key(referrer) != key for referrer in referrers):
+                linked.add(key)
+        return sorted(page for page in self.outgoing
+                      if page != "/" and _page_key(page) not in linked)
+
+
+    def to_dict(self, broken=None, orphans=None):
+        return {
+            "outgoing": {page: [list(link) for link in links]
+                         for page, links in sorted(self.outgoing.items())},
+            "incoming": {path: sorted(referrers)
+                         for path, referrers in sorted(self.incoming.items())},
+            "broken": [list(link) for link in broken or []],
+            "orphans": orphans or [],
+        }
+
+
+    def write_report(self, path: str, broken, orphans):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(broken, orphans), f, indent=1)
+
+
+    def report(self, broken, orphans, limit=20):
+        targets = sum(len(links) for links in self.outgoing.values())
+        lines = [f"Links: {targets} link(s) and image(s) on {len(self.outgoing)} page(s), "
+                 f"{len(broken)} broken, {len(orphans)} orphan page(s)"]
+        for page, kind, target in broken[:limit]:
+            lines.append(f"  broken {kind} on {page}: {target}")
+        if len(broken) > limit:
+            lines.append(f"  ... and {len(broken) - limit} more broken target(s)")
+        for page in orphans[:limit]:
+            lines.append(f"  orphan page: {page}")
+        if len(orphans) > limit:
+            lines.append(f"  ... and {len(orphans) - limit} more orphan page(s)")
+        return "\n".join(lines)
+
+
+def _page_key(path: str):
+    # /dir, /dir/ and /dir/index.html are the same page
+    return path.removesuffix("index.html").rstrip("/")
+
+
+def _site_path_exists(root: str, path: str):
+    fs_path = os.path.join(root, *[part for part in path.split("/") if part])
+    if os.path.isfile(fs_path):
+        return True
+    return os.path.isfile(os.path.join(fs_path, "index.html"))
@@ -1,10 +1,222 @@
-from buzz import (
-    copy_dir_recursively,
-    generate_pages_recursive
-)
+import argparse
+import os
+import shutil
+
+from assets import link_copy, link_hardlink, link_reflink, sync_dir
+from buzz import generate_pages_recursive
+from compress import available_encodings, compress_dir, remove_compressed
+from images import ImagePipeline, can_make_variants, remove_variants
+from links import LinkIndex
+from manifest import BuildManifest
+from output import STAGING_SUFFIX, OutputWriter, publish_dir, stage_dir
+from profiler import BuildProfiler
+from render_cache import CACHE_DIR, BlockMemo, RenderCache
+from search import SEARCH_DIR, SearchIndex, remove_index
+from store import store_dir
+from watch import watch
+
+MANIFEST_PATH = "./.buzz-manifest.json"
+PUBLIC_DIR = "./public/"
+
+def parse_widths(text: str):
+    widths = [int(width) for width in text.split(",") if width.strip()]
+    if any(width <= 0 for width in widths):
+        raise argparse.ArgumentTypeError(f"Invalid widths {text}")
+    return widths
+
+
+def build(args, dest_dir: str, manifest_path: str, profiler=None):
+    manifest = BuildManifest.load(manifest_path)
+    stats = sync_dir("./static/", dest_dir, manifest, link=args.link_assets,
+                     workers=args.asset_workers)
+    print(f"Synced static files: {stats.copied} copied, {stats.skipped} unchanged, "
+          f"{stats.removed} removed in {stats.seconds:.3f}s "
+          f"({stats.files_per_sec():.1f} files/s, {stats.bytes_per_sec() / 2**20:.1f} MiB/s)")
+
+    images = None
+    if args.images or args.image_widths:
+        if args.image_widths and not can_make_variants():
+            print("Pillow is not installed, images get their dimensions but no variants")
+        images = ImagePipeline("./static/", dest_dir, args.image_widths or ())
+        image_stats = images.prepare(manifest, workers=os.cpu_count() or 1)
+        print(f"Images: {image_stats.images} image(s), {image_stats.processed} read, "
+              f"{image_stats.skipped} unchanged, {image_stats.variants} variant(s) "
+              f"({image_stats.resized} resized, {image_stats.removed} stale removed) "
+              f"in {image_stats.seconds:.3f}s")
+        if image_stats.variants:
+            print(f"Smallest image variants weigh {image_stats.ratio() * 100:.1f}% "
+                  f"of their originals")
+    elif manifest.images:
+        print(f"Removed {remove_variants(dest_dir, manifest)} image variant(s)")
+    manifest.save()
+
+    cache = None if args.no_cache else RenderCache(CACHE_DIR, int(args.cache_size * (1 << 20)))
+    memo = BlockMemo(args.memo_entries) if args.memo_entries > 0 else None
+    link_index = LinkIndex() if args.check_links else None
+    search_index = SearchIndex(CACHE_DIR) if args.search else None
+    output = OutputWriter(dest_dir)
+    try:
+        generate_pages_recursive("./content/", "./template.html", dest_dir,
+                                 manifest_path, jobs=args.jobs, profiler=profiler, cache=cache,
+                                 memo=memo, link_index=link_index, images=images,
+                                 search_index=search_index, output=output)
+    finally:
+        if cache is not None:
+            cache.evict()
+            cache.close()
+    print(f"Pages: {output.written} written ({output.bytes_written / 2**20:.1f} MiB), "
+          f"{output.unchanged} unchanged and left as they were")
+    if memo is not None:
+        print(f"Block memo: {memo.hits} hit(s), {memo.misses} miss(es), "
+              f"{memo.hit_rate() * 100:.1f}% hit rate ({memo.max_entries} entries per process)")
+    if cache is not None:
+        print(f"Render cache: {cache.hits} hit(s), {cache.misses} miss(es), "
+              f"{cache.hit_rate() * 100:.1f}% hit rate")
+
+    if link_index is not None:
+        broken = link_index.validate(dest_dir, "./static/")
+        orphans = link_index.orphans()
+        print(link_index.report(broken, orphans))
+        if args.link_report:
+            link_index.write_report(args.link_report, broken, orphans)
+
+    if search_index is not None:
+        print(search_index.report(search_index.write(dest_dir)))
+    elif remove_index(dest_dir):
+        print(f"Removed the search index of an earlier build from "
+              f"{os.path.join(dest_dir, SEARCH_DIR)}/")
+
+    # page generation saved its own changes to the manifest
+    manifest = BuildManifest.load(manifest_path)
+    if args.compress:
+        stats = compress_dir(dest_dir, manifest, workers=os.cpu_count() or 1)
+        ratios = ", ".join(f"{encoding} {stats.ratio(encoding) * 100:.1f}%"
+                           for encoding in available_encodings())
+        print(f"Compressed files: {stats.compressed} compressed, {stats.skipped} unchanged, "
+              f"{stats.removed} stale sibling(s) removed in {stats.seconds:.3f}s ({ratios})")
+    elif manifest.compressed:
+        print(f"Removed {remove_compressed(dest_dir, manifest)} stale compressed sibling(s)")
+    if args.store:
+        stats = store_dir(dest_dir, args.store, manifest)
+        print(f"Stored {stats.files} file(s) as {stats.objects} object(s) in {args.store}: "
+              f"{stats.written} written ({stats.bytes_written / 2**20:.1f} of "
+              f"{stats.bytes_total / 2**20:.1f} MiB), {stats.unchanged} unchanged, "
+              f"{stats.deduplicated} duplicate(s), {stats.removed} removed "
+              f"in {stats.seconds:.3f}s")
+    manifest.save()
+
 
 def main():
-    copy_dir_recursively("./static/", "./public/")
-    generate_pages_recursive("./content/", "./template.html", "./public/")
+    parser = argparse.ArgumentParser(description="Build the static site into ./public/")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=1,
+        help="Number of processes generating pages, 0 uses every CPU",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Time every build stage and report the slowest pages and stages",
+    )
+    parser.add_argument(
+        "--link-assets", choices=[link_copy, link_hardlink, link_reflink], default=link_copy,
+        help="How static files are put into ./public/, reflinks fall back to copies",
+    )
+    parser.add_argument(
+        "--asset-workers", type=int, default=8,
+        help="Number of threads copying static files",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help=f"Do not reuse the HTML of unchanged documents and blocks from {CACHE_DIR}",
+    )
+    parser.add_argument(
+        "--cache-size", type=float, default=256,
+        help="Size in MB past which the least recently used cache entries are evicted",
+    )
+    parser.add_argument(
+        "--memo-entries", type=int, default=4096,
+        help="Number of rendered blocks each process keeps in memory for reuse, 0 disables it",
+    )
+    parser.add_argument(
+        "--check-links", action="store_true",
+        help="Index every link and image, report broken internal targets and orphan pages",
+    )
+    parser.add_argument(
+        "--link-report", metavar="PATH",
+        help="With --check-links, also write the whole link index and its findings as JSON",
+    )
+    parser.add_argument(
+        "--search", action="store_true",
+        help=f"Write a search index of every page, and its client, to ./public/{SEARCH_DIR}/",
+    )
+    parser.add_argument(
+        "--images", action="store_true",
+        help="Give the images of pages their width and height, and load them lazily",
+    )
+    parser.add_argument(
+        "--image-widths", type=parse_widths, metavar="W1,W2,...",
+        help="Implies --images, also write downscaled variants of images and a srcset "
+             "(needs Pillow)",
+    )
+    parser.add_argument(
+        "--compress", action="store_true",
+        help="Write .gz (and .br with the brotli package) siblings of the text files in ./public/",
+    )
+    parser.add_argument(
+        "--store", metavar="DIR",
+        help="Also write ./public/ to DIR as content-addressed objects and an index",
+    )
+    parser.add_argument(
+        "--staged", action="store_true",
+        help="Build into a copy of ./public/ and swap it into place once the build succeeded",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="After building, serve ./public/ and rebuild whatever changes",
+    )
+    parser.add_argument("--port", type=int, default=8888, help="Port of the watch mode server")
+    args = parser.parse_args()
+
+    profiler = BuildProfiler() if args.profile else None
+
+    # a staged build goes to a copy of ./public/ and of the manifest, which only replace
+    # the originals once the build is complete
+    dest_dir = PUBLIC_DIR
+    manifest_path = MANIFEST_PATH
+    if args.staged:
+        dest_dir = stage_dir(PUBLIC_DIR)
+        manifest_path = MANIFEST_PATH + STAGING_SUFFIX
+        manifest = BuildManifest.load(MANIFEST_PATH)
+        manifest.path = manifest_path
+        manifest.rebase_outputs(PUBLIC_DIR, dest_dir)
+        manifest.save()
+
+    try:
+        build(args, dest_dir, manifest_path, profiler)
+    except BaseException:
+        if args.staged:
+            # neither ./public/ nor the manifest describing it were touched
+            shutil.rmtree(dest_dir, ignore_errors=True)
+            os.remove(manifest_path)
+            print(f"The staged build failed, {PUBLIC_DIR} was left as it was")
+        raise
+
+    if args.staged:
+        atomic = publish_dir(dest_dir, PUBLIC_DIR)
+        manifest = BuildManifest.load(manifest_path)
+        manifest.path = MANIFEST_PATH
+        manifest.rebase_outputs(dest_dir, PUBLIC_DIR)
+        manifest.save()
+        os.remove(manifest_path)
+        print(f"Published the staged build to {PUBLIC_DIR}"
+              f"{'' if atomic else ', not atomically on this system'}")
+
+    if profiler is not None:
+        print(profiler.report())
+
+    if args.watch:
+        watch("./content/", "./static/", "./template.html", PUBLIC_DIR,
+              MANIFEST_PATH, port=args.port, link=args.link_assets)
+
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+def hash_bytes(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stat_and_hash(path: str):
+    # stat first: an edit made while the file is hashed, or built, leaves it with a newer
+    # mtime than the one recorded, so the next build looks at it again
+    stat = os.stat(path)
+    return stat, hash_file(path)
+
+
+class BuildManifest():
+    def __init__(self, path=None):
+        self.path = path
+        self.template_hash = None
+        self.pages = {}
+        self.assets = {}
+        self.compressed = {}
+        self.images = {}
+        self.stored = {}
+
+
+    @classmethod
+    def load(cls, path: str):
+        manifest = cls(path)
+        if not os.path.exists(path):
+            return manifest
+
+        with open(path, 'r') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                # a corrupt manifest only costs us a full rebuild
+                return manifest
+
+        if data.get("version") != MANIFEST_VERSION:
+            return manifest
+
+        manifest.template_hash = data.get("template")
+        manifest.pages = data.get("pages", {})
+        manifest.assets = data.get("assets", {})
+        manifest.compressed = data.get("compressed", {})
+        manifest.images = data.get("images", {})
+        manifest.stored = data.get("stored", {})
+        return manifest
+
+
+    def save(self):
+        if not self.path:
+            raise ValueError("The manifest has no path to be saved to.")
+
+        data = {
+            "version": MANIFEST_VERSION,
+            "template": self.template_hash,
+            "pages": self.pages,
+            "assets": self.assets,
+            "compressed": self.compressed,
+            "images": self.images,
+            "stored": self.stored,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+    def set_template(self, template_hash: str):
+        # every page embeds the template, pages built with another one are stale, their
+        # entries are kept so the outputs of deleted sources are still removed
+        self.template_hash = template_hash
+
+
+    def is_stale(self, src_path: str, dest_path: str):
+        entry = self.pages.get(os.path.normpath(src_path))
+        if entry is None:
+            return True
+        if entry.get("template") != self.template_hash:
+            return True
+        if entry["output"] != os.path.normpath(dest_path):
+            return True
+        if not os.path.exists(dest_path):
+            return True
+
+        stat = os.stat(src_path)
+        if stat.st_mtime_ns == entry["mtime_ns"] and stat.st_size == entry["size"]:
+            return False
+
+        # touched but possibly not modified, the content hash decides
+        if hash_file(src_path) != entry["hash"]:
+            return True
+        entry["mtime_ns"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        return False
+
+
+    def record(self, src_path: str, dest_path: str, content_hash=None, links=None,
+               search_document=None, stat=None, images=None):
+        # content_hash and stat describe the source the page was built from
+        if content_hash is None:
+            stat, content_hash = stat_and_hash(src_path)
+        elif stat is None:
+            stat = os.stat(src_path)
+
+        entry = {
+            "hash": content_hash,
+            "output": os.path.normpath(dest_path),
+            "template": self.template_hash,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+        }
+        if links is not None:
+            entry["links"] = [list(link) for link in links]
+        if search_document is not None:
+            entry["search"] = search_document
+        if images is not None:
+            entry["images"] = images
+        self.pages[os.path.normpath(src_path)] = entry
+
+
+    def page_links(self, src_path: str):
+        # None when the page was last built without collecting its links
+        entry = self.pages.get(os.path.normpath(src_path))
+        if entry is None:
+            return None
+        return entry.get("links")
+
+
+    def page_images(self, src_path: str):
+        # site path -> reference of the images the page was built with, None without them
+        entry = self.pages.get(os.path.normpath(src_path))
+        if entry is None:
+            return None
+        return entry.get("images")
+
+
+    def page_search_document(self, src_path: str):
+        # hash of the words of the page in the search index store, None without one
+        entry = self.pages.get(os.path.normpath(src_path))
+        if entry is None:
+            return None
+        return entry.get("search")
+
+
+    def page_search_documents(self):
+        return [entry["search"] for entry in self.pages.values() if "search" in entry]
+
+
+    def rebase_outputs(self, old_dir: str, new_dir: str):
+        # outputs built into a directory which then took the place of another
+        old_dir = os.path.normpath(old_dir)
+        new_dir = os.path.normpath(new_dir)
+        for entry in self.pages.values():
+            output = entry["output"]
+            if output == old_dir or output.startswith(old_dir + os.sep):
+                entry["output"] = new_dir + output[len(old_dir):]
+
+
+    def remove_missing(self, seen_src_paths):
+        seen = set(os.path.normpath(path) for path in seen_src_paths)
+        removed = []
+        for src_path in sorted(self.pages):
+            if src_path in seen:
+                continue
+            removed.append(self.pages.pop(src_path)["output"])
+        return removed
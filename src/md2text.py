@@ -10,6 +10,12 @@ from textnode import (
     text_type_link,
 )
 
+INLINE_MARKUP_RE = re.compile(r"\*\*|[*`\[]|!\[")
+ITALIC_CLOSE_RE = re.compile(r"(?<!\*)\*(?!\*)")
+IMAGE_RE = re.compile(r"!\[([^\[\]\n]*)\]\((.*?)\)")
+LINK_RE = re.compile(r"\[([^\[\]\n]*)\]\((.*?)\)")
+IMAGE_OR_LINK_RE = re.compile(r"!?\[([^\[\]\n]*)\]\((.*?)\)")
+
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
     new_nodes = []
 
@@ -98,11 +104,70 @@ def split_nodes_link(old_nodes):
 
 
 def text_to_text_nodes(text):
-    text_node = TextNode(text, text_type_text)
-    nodes = split_nodes_delimiter([text_node], "**", text_type_bold)
-    nodes = split_nodes_delimiter(nodes, "*", text_type_italic)
-    nodes = split_nodes_delimiter(nodes, "`", text_type_code)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
+    # A single left to right scan. Code spans win over everything else, the
+    # content of bold and italic spans may only contain links and images.
+    nodes = []
+    position = 0
+    search_from = 0
+
+    while True:
+        match = INLINE_MARKUP_RE.search(text, search_from)
+        if match is None:
+            break
+
+        start = match.start()
+        markup = match.group()
+        if markup == "[" or markup == "![":
+            link_match = (IMAGE_RE if markup == "![" else LINK_RE).match(text, start)
+            if link_match is None:
+                search_from = match.end()
+                continue
+            __append_text(nodes, text[position:start], text_type_text)
+            if markup == "![":
+                nodes.append(TextNode(link_match.group(1), text_type_image, link_match.group(2)))
+            else:
+                nodes.append(TextNode(link_match.group(1), text_type_link, link_match.group(2)))
+            position = search_from = link_match.end()
+            continue
+
+        if markup == "*":
+            close_match = ITALIC_CLOSE_RE.search(text, start + 1)
+            end = close_match.start() if close_match else -1
+        else:
+            end = text.find(markup, start + len(markup))
+        if end == -1:
+            raise ValueError("Invalid Markdown syntax: Formatted text was not closed")
+
+        __append_text(nodes, text[position:start], text_type_text)
+        content = text[start + len(markup):end]
+        if markup == "`":
+            __append_text(nodes, content, text_type_code)
+        elif markup == "**":
+            __append_links(nodes, content, text_type_bold)
+        else:
+            __append_links(nodes, content, text_type_italic)
+        position = search_from = end + len(markup)
+
+    __append_text(nodes, text[position:], text_type_text)
     return nodes
 
+
+def __append_text(nodes, text, text_type):
+    if text != "":
+        nodes.append(TextNode(text, text_type))
+
+
+def __append_links(nodes, text, text_type):
+    if "[" not in text:
+        __append_text(nodes, text, text_type)
+        return
+
+    position = 0
+    for match in IMAGE_OR_LINK_RE.finditer(text):
+        __append_text(nodes, text[position:match.start()], text_type)
+        if match.group().startswith("!"):
+            nodes.append(TextNode(match.group(1), text_type_image, match.group(2)))
+        else:
+            nodes.append(TextNode(match.group(1), text_type_link, match.group(2)))
+        position = match.end()
+    __append_text(nodes, text[position:], text_type)
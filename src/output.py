@@ -0,0 +1,200 @@
+import ctypes
+import ctypes.util
+import filecmp
+import locale
+import os
+import shutil
+
+from assets import copy_file, link_hardlink
+
+# pages are kept in memory up to this many characters, larger ones go to their
+# temporary file as they are written
+SPILL_CHARS = 1 << 20
+
+# what open(path, 'w') writes with
+ENCODING = locale.getpreferredencoding(False)
+
+TMP_SUFFIX = ".buzz-tmp"
+STAGING_SUFFIX = ".staging"
+
+# renameat2() flag swapping two paths at once, Linux only
+RENAME_EXCHANGE = 2
+AT_FDCWD = -100
+
+# dest_dir -> the writer of this process, see OutputWriter.__reduce__
+SHARED_WRITERS = {}
+
+class OutputFile():
+    # a file replaced by a rename once it is whole, never seen half written
+    def __init__(self, writer, path: str):
+        self.writer = writer
+        self.path = path
+        self.tmp_path = path + TMP_SUFFIX
+        self.parts = []
+        self.chars = 0
+        self.tmp = None
+
+
+    def write(self, text: str):
+        if self.tmp is not None:
+            self.tmp.write(text)
+            return
+        self.parts.append(text)
+        self.chars += len(text)
+        if self.chars >= SPILL_CHARS:
+            self.tmp = open(self.tmp_path, 'w', encoding=ENCODING)
+            self.tmp.write("".join(self.parts))
+            self.parts = []
+
+
+    def commit(self):
+        # unchanged bytes leave the file alone, its mtime included
+        if self.tmp is None:
+            data = "".join(self.parts).encode(ENCODING)
+            self.parts = []
+            return self.writer.put(self.path, data)
+
+        self.tmp.close()
+        self.tmp = None
+        size = os.path.getsize(self.tmp_path)
+        if (os.path.exists(self.path) and os.path.getsize(self.path) == size
+                and filecmp.cmp(self.tmp_path, self.path, shallow=False)):
+            os.remove(self.tmp_path)
+            self.writer.unchanged += 1
+            return False
+        os.replace(self.tmp_path, self.path)
+        self.writer.written += 1
+        self.writer.bytes_written += size
+        return True
+
+
+    def abort(self):
+        self.parts = []
+        if self.tmp is not None:
+            self.tmp.close()
+            self.tmp = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class OutputWriter():
+    def __init__(self, dest_dir=None):
+        self.dest_dir = dest_dir
+        # directories known to exist, so each one is only created once per process
+        self.created_dirs = set()
+        self.written = 0
+        self.unchanged = 0
+        self.bytes_written = 0
+
+
+    def __reduce__(self):
+        # every pool worker keeps a single writer, and the directories it made
+        return (shared_writer, (self.dest_dir,))
+
+
+    def makedirs(self, path: str):
+        if path in self.created_dirs:
+            return
+        os.makedirs(path, exist_ok=True)
+        self.created_dirs.add(path)
+
+
+    def open(self, path: str):
+        self.makedirs(os.path.dirname(path))
+        return OutputFile(self, path)
+
+
+    def put(self, path: str, data: bytes):
+        # a whole file at once, left alone when it already holds these bytes
+        self.makedirs(os.path.dirname(path))
+        if _has_content(path, data):
+            self.unchanged += 1
+            return False
+        tmp_path = path + TMP_SUFFIX
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.written += 1
+        self.bytes_written += len(data)
+        return True
+
+
+    def take_stats(self):
+        stats = {"written": self.written, "unchanged": self.unchanged,
+                 "bytes_written": self.bytes_written}
+        self.written = 0
+        self.unchanged = 0
+        self.bytes_written = 0
+        return stats
+
+
+    def merge_stats(self, stats: dict):
+        self.written += stats["written"]
+        self.unchanged += stats["unchanged"]
+        self.bytes_written += stats["bytes_written"]
+
+
+def shared_writer(dest_dir):
+    writer = SHARED_WRITERS.get(dest_dir)
+    if writer is None:
+        writer = SHARED_WRITERS[dest_dir] = OutputWriter(dest_dir)
+    return writer
+
+
+def stage_dir(dest_dir: str):
+    # a copy of dest_dir to build into, made of hard links: every writer of the build
+    # replaces files with a rename, the published files are never written through
+    dest_dir = os.path.normpath(dest_dir)
+    staging_dir = dest_dir + STAGING_SUFFIX
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    if os.path.isdir(dest_dir):
+        shutil.copytree(dest_dir, staging_dir, symlinks=True,
+                        copy_function=lambda src, dst: copy_file(src, dst, link_hardlink))
+    else:
+        os.makedirs(staging_dir)
+    return staging_dir
+
+
+def publish_dir(staging_dir: str, dest_dir: str):
+    # puts the staged build in place of dest_dir, swapped at once where the system can
+    dest_dir = os.path.normpath(dest_dir)
+    staging_dir = os.path.normpath(staging_dir)
+    if not os.path.exists(dest_dir):
+        os.rename(staging_dir, dest_dir)
+        return True
+    atomic = __exchange(staging_dir, dest_dir)
+    if not atomic:
+        old_dir = dest_dir + ".old"
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+        os.rename(dest_dir, old_dir)
+        os.rename(staging_dir, dest_dir)
+        staging_dir = old_dir
+    # the previous build, now at the other name
+    shutil.rmtree(staging_dir)
+    return atomic
+
+
+def __exchange(path_a: str, path_b: str):
+    libc_name = ctypes.util.find_library("c")
+    if libc_name is None:
+        return False
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    renameat2 = getattr(libc, "renameat2", None)
+    if renameat2 is None:
+        return False
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p,
+                          ctypes.c_uint]
+    return renameat2(AT_FDCWD, os.fsencode(path_a), AT_FDCWD, os.fsencode(path_b),
+                     RENAME_EXCHANGE) == 0
+
+
+def _has_content(path: str, data: bytes):
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
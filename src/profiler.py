@@ -0,0 +1,134 @@
+from time import perf_counter
+
+class BuildProfiler():
+    def __init__(self):
+        self.stages = {}
+        self.pages = {}
+        self.__start = perf_counter()
+        self.__page = None
+        self.__page_stages = None
+        self.__page_start = None
+
+
+    def start_page(self, page: str):
+        self.__page = page
+        self.__page_stages = {}
+        self.__page_start = perf_counter()
+
+
+    def end_page(self):
+        if self.__page is None:
+            return
+        self.pages[self.__page] = {
+            "total": perf_counter() - self.__page_start,
+            "stages": self.__page_stages,
+        }
+        self.__page = None
+        self.__page_stages = None
+
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if self.__page_stages is not None:
+            self.__page_stages[stage] = self.__page_stages.get(stage, 0.0) + seconds
+
+
+    def stage(self, stage: str):
+        return StageTimer(self, stage)
+
+
+    def to_dict(self):
+        return {"stages": self.stages, "pages": self.pages}
+
+
+    def merge(self, data: dict):
+        # used to gather the profiles of pages generated by pool workers
+        for stage, seconds in data["stages"].items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.pages.update(data["pages"])
+
+
+    def report(self, slowest=10):
+        wall = perf_counter() - self.__start
+        total = sum(self.stages.values())
+        lines = [f"Build profile: {len(self.pages)} page(s) in {wall:.3f}s"]
+
+        lines.append("Stages (summed over every page and worker):")
+        for stage, seconds in sorted(self.stages.items(), key=lambda item: -item[1]):
+            share = seconds / total * 100 if total else 0.0
+            lines.append(f"  {stage:<12} {seconds:9.4f}s {share:5.1f}%")
+
+        lines.append(f"Slowest {min(slowest, len(self.pages))} page(s):")
+        pages = sorted(self.pages.items(), key=lambda item: -item[1]["total"])
+        for page, timings in pages[:slowest]:
+            stage, seconds = max(timings["stages"].items(), key=lambda item: item[1],
+                                 default=("-", 0.0))
+            lines.append(f"  {timings['total']:9.4f}s  {page}  (mostly {stage}, {seconds:.4f}s)")
+
+        return "\n".join(lines)
+
+
+class StageTimer():
+    __slots__ = ("profiler", "stage", "start")
+
+    def __init__(self, profiler, stage: str):
+        self.profiler = profiler
+        self.stage = stage
+        self.start = None
+
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add(self.stage, perf_counter() - self.start)
+        return False
+
+
+class TimedCalls():
+    __slots__ = ("function", "seconds")
+
+    def __init__(self, function):
+        self.function = function
+        self.seconds = 0.0
+
+
+    def __call__(self, *args):
+        start = perf_counter()
+        result = self.function(*args)
+        self.seconds += perf_counter() - start
+        return result
+
+
+class NullProfiler():
+    def start_page(self, page: str):
+        pass
+
+
+    def end_page(self):
+        pass
+
+
+    def add(self, stage: str, seconds: float):
+        pass
+
+
+    def stage(self, stage: str):
+        return NULL_STAGE
+
+
+class NullStage():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_STAGE = NullStage()
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from leafnode import LeafNode
+from manifest import hash_bytes
+
+# bump whenever the markdown renderer changes its output, old entries are dropped
+RENDER_CACHE_VERSION = 1
+
+CACHE_DIR = "./.buzz-cache"
+
+# shorter blocks are parsed faster than they are looked up
+MIN_BLOCK_LENGTH = 128
+
+# pending entries written in one go, bounding the memory they hold on to
+FLUSH_ENTRIES = 1000
+
+# sqlite caps the number of parameters of a statement
+MAX_QUERY_KEYS = 500
+
+# max_entries -> the memo of this process, see BlockMemo.__reduce__
+SHARED_MEMOS = {}
+
+def block_key(text: str):
+    return "block:" + hash_bytes(text.encode())
+
+
+def document_key(markdown: str):
+    return "doc:" + hash_bytes(markdown.encode())
+
+
+class RenderCache():
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=256 << 20):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, "render.sqlite")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # writes wait for flush(), in a single transaction
+        self.pending = {}
+        self.used = set()
+        # only the process which made the cache writes to it, see __setstate__
+        self.owner = True
+        self.__connection = None
+
+
+    def __getstate__(self):
+        # pool workers get the location of the cache and open their own connection
+        return {"cache_dir": self.cache_dir, "max_bytes": self.max_bytes}
+
+
+    def __setstate__(self, state):
+        self.__init__(state["cache_dir"], state["max_bytes"])
+        # a pool worker keeps its writes pending until take_pending(), several processes
+        # writing at once would lock the database
+        self.owner = False
+
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        found = {key: self.pending[key] for key in keys if key in self.pending}
+        missing = [key for key in keys if key not in found]
+
+        if missing and os.path.exists(self.path):
+            connection = self.__connect()
+            for i in range(0, len(missing), MAX_QUERY_KEYS):
+                chunk = missing[i:i + MAX_QUERY_KEYS]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(connection.execute(
+                    f"SELECT key, html FROM entries WHERE key IN ({placeholders})", chunk))
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        # a use is what keeps an entry from being evicted
+        self.used.update(found)
+        return found
+
+
+    def get(self, key: str):
+        return self.get_many([key]).get(key)
+
+
+    def put_many(self, entries):
+        self.pending.update(entries)
+        if self.owner and len(self.pending) >= FLUSH_ENTRIES:
+            self.flush()
+
+
+    def put(self, key: str, html: str):
+        self.put_many({key: html})
+
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+    def take_pending(self):
+        # what a pool worker hands back to the cache of the main process
+        data = {
+            "pending": self.pending,
+            "used": sorted(self.used),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+        self.pending = {}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+        return data
+
+
+    def merge(self, data: dict):
+        self.used.update(data["used"])
+        self.hits += data["hits"]
+        self.misses += data["misses"]
+        self.put_many(data["pending"])
+
+
+    def flush(self):
+        if not self.pending and not self.used:
+            return
+        now = time.time_ns()
+        with self.__connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO entries (key, html, size, used) VALUES (?, ?, ?, ?)",
+                [(key, html, len(html), now) for key, html in self.pending.items()])
+            connection.executemany("UPDATE entries SET used = ? WHERE key = ?",
+                                   [(now, key) for key in self.used - self.pending.keys()])
+        self.pending = {}
+        self.used = set()
+
+
+    def size(self):
+        return self.__connect().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+
+    def evict(self):
+        # drops the least recently used entries until the cache fits in max_bytes
+        self.flush()
+        with self.__connect() as connection:
+            cursor = connection.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM ("
+                "  SELECT key, SUM(size) OVER (ORDER BY used DESC, key) AS total FROM entries"
+                " ) WHERE total > ?"
+                ")", (self.max_bytes,))
+            evicted = cursor.rowcount
+        return evicted
+
+
+    def clear(self):
+        self.pending = {}
+        self.used = set()
+        with self.__connect() as connection:
+            connection.execute("DELETE FROM entries")
+
+
+    def close(self):
+        self.flush()
+        if self.__connection is not None:
+            self.__connection.close()
+            self.__connection = None
+
+
+    def __connect(self):
+        if self.__connection is not None:
+            return self.__connection
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # pool workers read while the main process writes
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, html TEXT NOT NULL,"
+                " size INTEGER NOT NULL, used INTEGER NOT NULL)")
+            row = connection.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+            if row is None or row[0] != str(RENDER_CACHE_VERSION):
+                connection.execute("DELETE FROM entries")
+                connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+                                   (str(RENDER_CACHE_VERSION),))
+        self.__connection = connection
+        return connection
+
+
+class BlockMemo():
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        # block text -> rendered HTML, None for blocks seen once, least recently used first
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def __reduce__(self):
+        # every pool worker keeps a single memo for all the pages it builds
+        return (shared_memo, (self.max_entries,))
+
+
+    def get(self, text: str):
+        html = self.entries.get(text)
+        if html is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(text)
+        self.hits += 1
+        return html
+
+
+    def put(self, text: str, node):
+        # most blocks are never seen again, only those seen twice are kept rendered,
+        # the others are not worth a to_html() nor the memory of their nodes
+        if text in self.entries:
+            node = LeafNode(None, node.to_html())
+            self.entries[text] = node.value
+            self.entries.move_to_end(text)
+        else:
+            self.entries[text] = None
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return node
+
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+    def take_stats(self):
+        stats = {"hits": self.hits, "misses": self.misses}
+        self.hits = 0
+        self.misses = 0
+        return stats
+
+
+    def merge_stats(self, stats: dict):
+        self.hits += stats["hits"]
+        self.misses += stats["misses"]
+
+
+def shared_memo(max_entries: int):
+    memo = SHARED_MEMOS.get(max_entries)
+    if memo is None:
+        memo = SHARED_MEMOS[max_entries] = BlockMemo(max_entries)
+    return memo
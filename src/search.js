@@ -0,0 +1,114 @@
+// Client of the search index written by `main.py --search`, see search.py.
+//
+//   <script src="/search-index/search.js"></script>
+//   buzzSearch('"lord of the rings" majesty').then(results => ...)
+//
+// resolves to [{url, title, score}], best first. Every word has to be in a page,
+// quoted words have to follow each other. Shards are fetched as words need them.
+
+(() => {
+    const base = new URL(".", document.currentScript.src);
+    const loaded = new Map();
+
+    function load(name) {
+        if (!loaded.has(name)) {
+            loaded.set(name, fetch(new URL(name, base)).then(response => {
+                if (!response.ok) {
+                    throw new Error(`Could not load ${name}: ${response.status}`);
+                }
+                const json = response.body.pipeThrough(new DecompressionStream("gzip"));
+                return new Response(json).json();
+            }));
+        }
+        return loaded.get(name);
+    }
+
+    // the same words as search.tokenize()
+    function tokenize(text) {
+        return (text.toLowerCase().match(/[\p{L}\p{N}_]+/gu) || [])
+            .filter(word => word.length <= 40);
+    }
+
+    // the same hash as search.term_hash()
+    function termHash(term) {
+        let h = 0x811c9dc5;
+        for (const byte of new TextEncoder().encode(term)) {
+            h = Math.imul(h ^ byte, 0x01000193) >>> 0;
+        }
+        return h;
+    }
+
+    // page id -> {inTitle, count, positions}
+    function decode(postings) {
+        const pages = new Map();
+        let page = 0;
+        for (let i = 0; i < postings.length;) {
+            page += postings[i];
+            const inTitle = postings[i + 1] === 1;
+            const count = postings[i + 2];
+            const positions = [];
+            let position = 0;
+            const end = i + 3 + Math.min(count, meta.positions);
+            for (i += 3; i < end; i++) {
+                position += postings[i];
+                positions.push(position);
+            }
+            pages.set(page, {inTitle, count, positions});
+        }
+        return pages;
+    }
+
+    let meta = null;
+
+    async function lookup(term) {
+        const shard = await load(`shard-${termHash(term) % meta.shards}.json.gz`);
+        return decode(shard[term] || []);
+    }
+
+    function followEachOther(phrase, page) {
+        // positions past the first ones are not in the index, the phrase can only be
+        // found among those
+        const [first, ...rest] = phrase.map(postings => postings.get(page).positions);
+        return first.some(start => rest.every((positions, i) => positions.includes(start + i + 1)));
+    }
+
+    window.buzzSearch = async function (query, limit = 20) {
+        meta = meta || await load("pages.json.gz");
+        const phrases = [];
+        query.replace(/"([^"]*)"|([^"]+)/g, (_, quoted, words) => {
+            if (quoted !== undefined) {
+                phrases.push(tokenize(quoted));
+            } else {
+                phrases.push(...tokenize(words).map(word => [word]));
+            }
+        });
+        const terms = [...new Set(phrases.flat())];
+        if (terms.length === 0) {
+            return [];
+        }
+
+        const postings = new Map(await Promise.all(
+            terms.map(async term => [term, await lookup(term)])));
+        let pages = [...postings.get(terms[0]).keys()];
+        for (const term of terms.slice(1)) {
+            pages = pages.filter(page => postings.get(term).has(page));
+        }
+        for (const phrase of phrases.filter(phrase => phrase.length > 1)) {
+            const phrasePostings = phrase.map(term => postings.get(term));
+            pages = pages.filter(page => followEachOther(phrasePostings, page));
+        }
+
+        const total = meta.pages.length;
+        return pages.map(page => {
+            let score = 0;
+            for (const term of terms) {
+                const found = postings.get(term);
+                const {inTitle, count} = found.get(page);
+                const idf = Math.log(1 + total / found.size);
+                score += idf * (Math.log(1 + count) + (inTitle ? meta.titleBoost : 0));
+            }
+            const [url, title] = meta.pages[page];
+            return {url, title, score};
+        }).sort((a, b) => b.score - a.score).slice(0, limit);
+    };
+})();
@@ -0,0 +1,297 @@
+import gzip
+import json
+import math
+import operator
+import os
+import re
+import shutil
+from html import unescape
+from time import perf_counter
+
+from manifest import hash_bytes
+from output import OutputWriter
+from render_cache import CACHE_DIR
+
+SEARCH_INDEX_VERSION = 1
+
+# directory of public/ the index and its client are written to
+SEARCH_DIR = "search-index"
+
+# the client, served next to the index
+CLIENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "search.js")
+
+# the client has to split words the same way, see search.js
+WORD_RE = re.compile(r"\w+")
+MAX_TERM_LENGTH = 40
+
+# positions kept per term and page, enough for phrases near the top of a page
+MAX_POSITIONS = 16
+
+# weight of a term found in the title of a page, added to that of its occurrences
+TITLE_BOOST = 4.0
+
+# uncompressed bytes per shard, the client fetches the shards of the terms it looks up only
+SHARD_SIZE = 256 << 10
+
+# characters of HTML indexed at once
+FEED_SIZE = 64 << 10
+
+# text in these elements is never shown
+SKIPPED_RE = re.compile(r"<(script|style|template)\b.*?</\1\s*>", re.DOTALL | re.IGNORECASE)
+SKIPPED_START_RE = re.compile(r"<(?:script|style|template)\b", re.IGNORECASE)
+
+# comments, doctypes and tags of elements which are not part of a line of text
+BLOCK_TAG_RE = re.compile(
+    r"<!--.*?-->|<(?!/?(?:a|abbr|b|code|em|i|img|kbd|mark|q|s|small|span|strong|sub|sup|u)\b)"
+    r"[!?/]?[A-Za-z][^>]*>", re.DOTALL | re.IGNORECASE)
+TAG_RE = re.compile(r"</?[A-Za-z][^>]*>")
+
+def tokenize(text: str):
+    return [word for word in WORD_RE.findall(text.lower()) if len(word) <= MAX_TERM_LENGTH]
+
+
+def term_hash(term: str):
+    # 32 bit FNV-1a over the UTF-8 bytes of term, simple enough to be repeated in the client
+    h = 0x811C9DC5
+    for byte in term.encode():
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+class PageIndexer():
+    # the words of a page, taken from its HTML as it is written, positions count words
+    def __init__(self, title=""):
+        self.title = title
+        self.terms = {}
+        self.position = 0
+        self.seconds = 0.0
+        self.__buffer = []
+        self.__buffered = 0
+        # the end of what was indexed, a word or a tag it may cut in two
+        self.__carry = ""
+
+
+    def tee(self, write):
+        def index(html):
+            self.feed(html)
+            write(html)
+        return index
+
+
+    def feed(self, html: str):
+        # pages are written in many small pieces, they are indexed in larger ones
+        self.__buffer.append(html)
+        self.__buffered += len(html)
+        if self.__buffered >= FEED_SIZE:
+            self.__index(final=False)
+
+
+    def close(self):
+        # indexes what is left once the whole page was written
+        if self.__buffer or self.__carry:
+            self.__index(final=True)
+
+
+    def to_document(self):
+        self.close()
+        return {"title": self.title, "terms": self.terms}
+
+
+    def __index(self, final: bool):
+        start = perf_counter()
+        data = self.__carry + "".join(self.__buffer)
+        self.__buffer = []
+        self.__carry = ""
+        self.__buffered = 0
+        if not final:
+            # the words and the tag at the end may go on in the next piece
+            cut = data.rfind(">") + 1
+            data, self.__carry = data[:cut], data[cut:]
+
+        data = SKIPPED_RE.sub(" ", data)
+        unclosed = SKIPPED_START_RE.search(data)
+        if unclosed is not None:
+            # a script, style or template has to be whole to be dropped
+            if not final:
+                self.__carry = data[unclosed.start():] + self.__carry
+            data = data[:unclosed.start()]
+        # tags are dropped, those of blocks also separate words
+        text = TAG_RE.sub("", BLOCK_TAG_RE.sub(" ", data))
+
+        terms = self.terms
+        words = tokenize(unescape(text))
+        for position, word in enumerate(words, self.position):
+            # [count, first positions...]
+            entry = terms.get(word)
+            if entry is None:
+                terms[word] = [1, position]
+            elif entry[0] < MAX_POSITIONS:
+                entry[0] += 1
+                entry.append(position)
+            else:
+                entry[0] += 1
+        self.position += len(words)
+        self.seconds += perf_counter() - start
+
+
+class SearchStats():
+    def __init__(self):
+        self.pages = 0
+        self.terms = 0
+        self.postings = 0
+        self.shards = 0
+        self.bytes_raw = 0
+        self.bytes_compressed = 0
+        self.written = 0
+        self.unchanged = 0
+        self.seconds = 0.0
+
+
+    def __repr__(self):
+        return (f"SearchStats(pages = {self.pages}, terms = {self.terms}, "
+                f"postings = {self.postings}, shards = {self.shards}, "
+                f"bytes_raw = {self.bytes_raw}, bytes_compressed = {self.bytes_compressed}, "
+                f"written = {self.written}, unchanged = {self.unchanged}, seconds = {self.seconds:.3f})")
+
+
+class SearchIndex():
+    def __init__(self, cache_dir=CACHE_DIR, shard_size=SHARD_SIZE):
+        # page URL path -> {"title": ..., "terms": {term: [count, first positions...]}}
+        self.documents = {}
+        self.store_dir = os.path.join(cache_dir, "search")
+        self.store_writer = OutputWriter(self.store_dir)
+        self.shard_size = shard_size
+        # time spent splitting pages into words, summed over every page and worker
+        self.seconds = 0.0
+
+
+    def add(self, page: str, document: dict, seconds=0.0):
+        self.documents[page] = document
+        self.seconds += seconds
+
+
+    def store_document(self, document: dict):
+        # the words of a page are kept by hash, for the next builds to skip the page
+        data = json.dumps(document, sort_keys=True, separators=(",", ":")).encode()
+        document_hash = hash_bytes(data)
+        path = os.path.join(self.store_dir, document_hash + ".json.gz")
+        if not os.path.exists(path):
+            self.store_writer.put(path, gzip.compress(data, mtime=0))
+        return document_hash
+
+
+    def load_document(self, document_hash):
+        if document_hash is None:
+            return None
+        path = os.path.join(self.store_dir, document_hash + ".json.gz")
+        try:
+            with gzip.open(path, 'rb') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def prune_store(self, document_hashes):
+        if not os.path.isdir(self.store_dir):
+            return 0
+        kept = set(document_hashes)
+        removed = 0
+        for name in os.listdir(self.store_dir):
+            if name.removesuffix(".json.gz") not in kept:
+                os.remove(os.path.join(self.store_dir, name))
+                removed += 1
+        return removed
+
+
+    def write(self, dest_dir: str):
+        start = perf_counter()
+        stats = SearchStats()
+        pages = sorted(self.documents)
+        stats.pages = len(pages)
+
+        # term -> flat postings: for each page, the page id minus the previous one,
+        # 1 if the term is in the title, the count of the term, then the gaps between
+        # its first min(count, MAX_POSITIONS) positions
+        postings = {}
+        last_page = {}
+        for page_id, page in enumerate(pages):
+            document = self.documents[page]
+            title_terms = set(tokenize(document["title"]))
+            for term, (count, *positions) in document["terms"].items():
+                postings_of_term = postings.setdefault(term, [])
+                postings_of_term.append(page_id - last_page.get(term, 0))
+                last_page[term] = page_id
+                postings_of_term.append(1 if term in title_terms else 0)
+                postings_of_term.append(count)
+                postings_of_term.extend(map(operator.sub, positions, [0] + positions))
+                stats.postings += 1
+            for term in title_terms - document["terms"].keys():
+                # a title always appears in the page, but the template may not show it
+                postings.setdefault(term, []).extend(
+                    (page_id - last_page.get(term, 0), 1, 0))
+                last_page[term] = page_id
+                stats.postings += 1
+        stats.terms = len(postings)
+
+        # numbers of postings take two characters in JSON on average
+        size = sum(len(term) + 2 * len(numbers) + 4 for term, numbers in postings.items())
+        shard_count = max(1, math.ceil(size / self.shard_size))
+        shards = [{} for _ in range(shard_count)]
+        for term in sorted(postings):
+            shards[term_hash(term) % shard_count][term] = postings[term]
+        stats.shards = shard_count
+
+        # files whose bytes did not change keep their mtime, for --compress and --store
+        index_dir = os.path.join(dest_dir, SEARCH_DIR)
+        output = OutputWriter(dest_dir)
+        meta = {
+            "version": SEARCH_INDEX_VERSION,
+            "shards": shard_count,
+            "positions": MAX_POSITIONS,
+            "titleBoost": TITLE_BOOST,
+            "pages": [[page, self.documents[page]["title"]] for page in pages],
+        }
+        names = ["pages.json.gz", "search.js"]
+        self.__write_json(output, os.path.join(index_dir, "pages.json.gz"), meta, stats)
+        for i, shard in enumerate(shards):
+            names.append(f"shard-{i}.json.gz")
+            self.__write_json(output, os.path.join(index_dir, names[-1]), shard, stats)
+        with open(CLIENT_PATH, 'rb') as f:
+            output.put(os.path.join(index_dir, "search.js"), f.read())
+        stats.written = output.written
+        stats.unchanged = output.unchanged
+
+        # the shards of a larger index, the rest was written over
+        for name in os.listdir(index_dir):
+            if name.startswith("shard-") and name not in names:
+                os.remove(os.path.join(index_dir, name))
+
+        stats.seconds = perf_counter() - start
+        return stats
+
+
+    def report(self, stats: SearchStats):
+        return (f"Search index: {stats.pages} page(s), {stats.terms} term(s), "
+                f"{stats.postings} posting(s) in {stats.shards} shard(s), "
+                f"{stats.bytes_compressed / 1024:.1f} KiB compressed "
+                f"({stats.bytes_raw / 1024:.1f} KiB raw, {stats.written} file(s) written, "
+                f"{stats.unchanged} unchanged), "
+                f"{self.seconds:.3f}s indexing pages, {stats.seconds:.3f}s writing the index")
+
+
+    def __write_json(self, output, path: str, value, stats: SearchStats):
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+        # past level 6, long runs of small numbers take ages to compress for little gain
+        compressed = gzip.compress(data, compresslevel=6, mtime=0)
+        output.put(path, compressed)
+        stats.bytes_raw += len(data)
+        stats.bytes_compressed += len(compressed)
+
+
+def remove_index(dest_dir: str):
+    # the index of an earlier build, a directory of that name without one is left alone
+    index_dir = os.path.join(dest_dir, SEARCH_DIR)
+    if not os.path.exists(os.path.join(index_dir, "pages.json.gz")):
+        return False
+    shutil.rmtree(index_dir)
+    return True
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import shutil
+from time import perf_counter
+
+from assets import copy_file, link_hardlink, link_reflink, walk_files
+from manifest import hash_file
+
+STORE_VERSION = 1
+
+INDEX_NAME = "index.json"
+OBJECTS_DIR = "objects"
+
+class StoreStats():
+    def __init__(self):
+        self.files = 0
+        self.objects = 0
+        self.written = 0
+        self.deduplicated = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.bytes_total = 0
+        self.bytes_written = 0
+        self.seconds = 0.0
+
+
+    def __repr__(self):
+        return (f"StoreStats(files = {self.files}, objects = {self.objects}, "
+                f"written = {self.written}, deduplicated = {self.deduplicated}, "
+                f"unchanged = {self.unchanged}, removed = {self.removed}, "
+                f"bytes_written = {self.bytes_written}, seconds = {self.seconds:.3f})")
+
+
+def object_path(content_hash: str, rel_path: str):
+    # the extension is kept for hosts which derive the content type from it
+    ext = os.path.splitext(rel_path)[1].lower()
+    return os.path.join(OBJECTS_DIR, content_hash[:2], content_hash[2:] + ext)
+
+
+def store_dir(root: str, store_root: str, manifest=None):
+    # puts every file of root in store_root under the hash of its content, files with the
+    # same content share an object, then the index maps their paths to the objects
+    if not os.path.exists(root):
+        raise FileNotFoundError(f"Source directory does not exist: {root}")
+
+    start = perf_counter()
+    stats = StoreStats()
+    stored = manifest.stored if manifest is not None else {}
+    files = {}
+    seen = set()
+    objects = set()
+    for rel_path, src_path, stat in walk_files(root):
+        seen.add(rel_path)
+        entry = stored.get(rel_path)
+        if (entry is not None and entry["mtime_ns"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size):
+            content_hash = entry["hash"]
+        else:
+            content_hash = hash_file(src_path)
+            stored[rel_path] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": content_hash,
+            }
+
+        name = object_path(content_hash, rel_path)
+        files[rel_path.replace(os.sep, "/")] = name.replace(os.sep, "/")
+        stats.files += 1
+        stats.bytes_total += stat.st_size
+
+        dst_path = os.path.join(store_root, name)
+        if name in objects:
+            stats.deduplicated += 1
+            continue
+        objects.add(name)
+        stats.objects += 1
+        if os.path.exists(dst_path):
+            stats.unchanged += 1
+            continue
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        # objects are never written to again, a clone of the output is enough
+        copy_file(src_path, dst_path, link_reflink)
+        stats.written += 1
+        stats.bytes_written += stat.st_size
+
+    for rel_path in set(stored) - seen:
+        del stored[rel_path]
+
+    # the index is replaced at once, the objects it points to are all in place by then
+    index = {"version": STORE_VERSION, "files": dict(sorted(files.items()))}
+    tmp_path = os.path.join(store_root, INDEX_NAME + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, os.path.join(store_root, INDEX_NAME))
+
+    stats.removed = __remove_unreferenced(store_root, set(files.values()))
+    stats.seconds = perf_counter() - start
+    return stats
+
+
+def load_index(store_root: str):
+    with open(os.path.join(store_root, INDEX_NAME), 'r') as f:
+        index = json.load(f)
+    if index.get("version") != STORE_VERSION:
+        raise ValueError(f"Unsupported store version {index.get('version')} in {store_root}")
+    return index["files"]
+
+
+def checkout(store_root: str, dest: str):
+    # lays the files of the index out under dest, objects are immutable so they are
+    # hard linked where the filesystem allows it
+    files = load_index(store_root)
+    if os.path.exists(dest):
+        shutil.rmtree(dest)
+    for rel_path, name in files.items():
+        dst_path = os.path.join(dest, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        copy_file(os.path.join(store_root, *name.split("/")), dst_path, link_hardlink)
+    return len(files)
+
+
+def __remove_unreferenced(store_root: str, names: set):
+    removed = 0
+    objects_dir = os.path.join(store_root, OBJECTS_DIR)
+    if not os.path.isdir(objects_dir):
+        return removed
+    for fanout in sorted(os.listdir(objects_dir)):
+        fanout_dir = os.path.join(objects_dir, fanout)
+        for object_name in os.listdir(fanout_dir):
+            if f"{OBJECTS_DIR}/{fanout}/{object_name}" not in names:
+                os.remove(os.path.join(fanout_dir, object_name))
+                removed += 1
+        if not os.listdir(fanout_dir):
+            os.rmdir(fanout_dir)
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Lay out the files of a content-addressed store written by main.py --store")
+    parser.add_argument("store", help="Directory of the store")
+    parser.add_argument("dest", help="Directory to lay the files out in, replaced if it exists")
+    args = parser.parse_args()
+    print(f"Checked out {checkout(args.store, args.dest)} file(s) to {args.dest}")
@@ -0,0 +1,50 @@
+import re
+
+PLACEHOLDER_RE = re.compile(r"{{ *([A-Za-z_][A-Za-z0-9_]*) *}}")
+
+class Template():
+    def __init__(self, text: str, path=None):
+        self.path = path
+        # literals always has one more element than placeholders, rendering
+        # interleaves them: literals[0], placeholders[0], literals[1], ...
+        self.literals = []
+        self.placeholders = []
+        self.__raw = []
+
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            self.literals.append(text[position:match.start()])
+            self.placeholders.append(match.group(1))
+            self.__raw.append(match.group(0))
+            position = match.end()
+        self.literals.append(text[position:])
+
+
+    def render(self, values: dict):
+        parts = []
+        self.render_into(parts.append, values)
+        return "".join(parts)
+
+
+    def render_into(self, write, values: dict):
+        # values are strings, or nodes which are rendered straight into write
+        write(self.literals[0])
+        for i, name in enumerate(self.placeholders):
+            value = values.get(name)
+            if value is None:
+                # placeholders without a value are left as they were written
+                write(self.__raw[i])
+            elif isinstance(value, str):
+                write(value)
+            else:
+                value.render_into(write)
+            write(self.literals[i + 1])
+
+
+    def __repr__(self):
+        return f"Template({self.path}, placeholders = {self.placeholders})"
+
+
+def load_template(template_path: str):
+    with open(template_path, 'r') as t:
+        return Template(t.read(), template_path)
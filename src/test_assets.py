@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from assets import compare_hash, link_hardlink, link_reflink, sync_dir, walk_files
+from manifest import BuildManifest
+
+class TestSyncDir(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmpdir.name, "static")
+        self.dst = os.path.join(self.tmpdir.name, "public")
+        self.manifest = BuildManifest(os.path.join(self.tmpdir.name, "manifest.json"))
+        os.makedirs(os.path.join(self.src, "images"))
+        self.__write(os.path.join(self.src, "index.css"), "body {}")
+        self.__write(os.path.join(self.src, "images", "logo.png"), "png")
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def __write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+    def __read(self, path):
+        with open(path, 'r') as f:
+            return f.read()
+
+
+    def test_syncDir_copiesEverythingOnce(self):
+        stats = sync_dir(self.src, self.dst, self.manifest)
+        self.assertEqual((stats.copied, stats.skipped, stats.bytes), (2, 0, 10))
+        self.assertEqual(self.__read(os.path.join(self.dst, "images", "logo.png")), "png")
+
+        stats = sync_dir(self.src, self.dst, self.manifest)
+        self.assertEqual((stats.copied, stats.skipped), (0, 2))
+
+
+    def test_syncDir_copiesChangedFiles(self):
+        sync_dir(self.src, self.dst, self.manifest)
+        self.__write(os.path.join(self.src, "index.css"), "body { margin: 0 }")
+
+        stats = sync_dir(self.src, self.dst, self.manifest)
+        self.assertEqual((stats.copied, stats.skipped), (1, 1))
+        self.assertEqual(self.__read(os.path.join(self.dst, "index.css")), "body { margin: 0 }")
+
+
+    def test_syncDir_removesStaleFilesOnly(self):
+        os.makedirs(self.dst)
+        self.__write(os.path.join(self.dst, "index.html"), "generated page")
+        sync_dir(self.src, self.dst, self.manifest)
+        os.remove(os.path.join(self.src, "index.css"))
+
+        stats = sync_dir(self.src, self.dst, self.manifest)
+        self.assertEqual(stats.removed, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "index.css")))
+        self.assertTrue(os.path.exists(os.path.join(self.dst, "index.html")))
+
+
+    def test_syncDir_withHashComparison(self):
+        sync_dir(self.src, self.dst, self.manifest, compare=compare_hash)
+        path = os.path.join(self.src, "index.css")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        stats = sync_dir(self.src, self.dst, self.manifest, compare=compare_hash)
+        self.assertEqual(stats.copied, 0)
+
+
+    def test_syncDir_withoutManifest(self):
+        sync_dir(self.src, self.dst)
+        stats = sync_dir(self.src, self.dst)
+        self.assertEqual((stats.copied, stats.skipped), (0, 2))
+
+
+    def test_syncDir_withHardlinks(self):
+        sync_dir(self.src, self.dst, self.manifest, link=link_hardlink)
+        self.assertTrue(os.path.samefile(os.path.join(self.src, "index.css"),
+                                         os.path.join(self.dst, "index.css")))
+
+
+    def test_syncDir_withReflinksFallsBackToCopies(self):
+        sync_dir(self.src, self.dst, self.manifest, link=link_reflink)
+        self.assertEqual(self.__read(os.path.join(self.dst, "index.css")), "body {}")
+        self.assertEqual(sorted(os.listdir(self.dst)), ["images", "index.css"])
+
+
+    def test_syncDir_withWorkers(self):
+        for i in range(20):
+            self.__write(os.path.join(self.src, "images", f"{i}.png"), str(i) * 100)
+
+        stats = sync_dir(self.src, self.dst, self.manifest, compare=compare_hash, workers=4)
+        self.assertEqual(stats.copied, 22)
+        self.assertGreater(stats.bytes_per_sec(), 0)
+        for i in range(20):
+            self.assertEqual(self.__read(os.path.join(self.dst, "images", f"{i}.png")), str(i) * 100)
+        self.assertTrue(all(entry["hash"] for entry in self.manifest.assets.values()))
+
+
+    def test_walkFiles_skipsWhatIsNotAFile(self):
+        os.symlink(os.path.join(self.src, "missing.png"), os.path.join(self.src, "dangling.png"))
+        walked = [(rel_path, path) for rel_path, path, _ in walk_files(self.src)]
+        self.assertListEqual(walked, [
+            (os.path.join("images", "logo.png"), os.path.join(self.src, "images", "logo.png")),
+            ("index.css", os.path.join(self.src, "index.css")),
+        ])
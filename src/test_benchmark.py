@@ -0,0 +1,78 @@
+import os
+import re
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from benchmark import DEFAULT_MIX, generate_corpus, parse_mix
+from block_md2text import markdown_to_html_node
+from buzz import extract_title, generate_pages_recursive
+from links import LinkIndex
+from textnode import text_type_link
+
+class TestBenchmark(unittest.TestCase):
+    def test_generateCorpus_producesValidPages(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            generate_corpus(tmpdir, 25, 30, DEFAULT_MIX, pages_per_dir=10, seed=3)
+
+            sources = []
+            for root, _, files in os.walk(tmpdir):
+                sources.extend(os.path.join(root, file) for file in files)
+            self.assertEqual(len(sources), 25)
+            self.assertEqual(len(os.listdir(tmpdir)), 3)
+
+            for source in sources:
+                with open(source, 'r') as f:
+                    markdown = f.read().removesuffix("\n")
+                self.assertTrue(extract_title(markdown).startswith("Page "))
+                markdown_to_html_node(markdown).to_html()
+
+
+    def test_generateCorpus_linksToExistingPages(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            generate_corpus(tmpdir, 40, 30, DEFAULT_MIX, pages_per_dir=7, seed=5)
+            targets = set()
+            for root, _, files in os.walk(tmpdir):
+                for file in files:
+                    with open(os.path.join(root, file), 'r') as f:
+                        targets.update(re.findall(r"\]\((/section\d+/page\d+\.html)\)",
+                                                  f.read()))
+            self.assertTrue(targets)
+            for target in targets:
+                source = target[1:].removesuffix(".html") + ".md"
+                self.assertTrue(os.path.exists(os.path.join(tmpdir, source)), target)
+
+
+    def test_generateCorpus_buildsWithoutBrokenLinks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            content = os.path.join(tmpdir, "content")
+            public = os.path.join(tmpdir, "public")
+            template = os.path.join(tmpdir, "template.html")
+            with open(template, 'w') as f:
+                f.write("<title>{{ Title }}</title>{{ Content }}")
+            generate_corpus(content, 20, 30, DEFAULT_MIX, pages_per_dir=6, seed=11)
+            link_index = LinkIndex()
+            with redirect_stdout(StringIO()):
+                generate_pages_recursive(content, template, public, link_index=link_index)
+
+            # the images are not part of the corpus, its links between pages are
+            links = [link for link in link_index.validate(public) if link[1] == text_type_link]
+            self.assertTrue(any(kind == text_type_link for links in link_index.outgoing.values()
+                                for kind, _ in links))
+            self.assertListEqual(links, [])
+
+
+    def test_generateCorpus_isDeterministic(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            generate_corpus(first, 3, 10, DEFAULT_MIX, seed=7)
+            generate_corpus(second, 3, 10, DEFAULT_MIX, seed=7)
+            for page in range(3):
+                path = os.path.join("section0", f"page{page}.md")
+                with open(os.path.join(first, path)) as a, open(os.path.join(second, path)) as b:
+                    self.assertEqual(a.read(), b.read())
+
+
+    def test_parseMix(self):
+        self.assertEqual(parse_mix("paragraph=3,code=1"), {"paragraph": 3.0, "code": 1.0})
+        self.assertRaises(ValueError, parse_mix, "table=1")
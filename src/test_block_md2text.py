@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from block_md2text import (
@@ -9,7 +10,10 @@ from block_md2text import (
     block_type_quote,
     block_type_orderedlist,
     block_type_unorderedlist,
-    markdown_to_html_node
+    markdown_to_html_node,
+    lex_blocks,
+    markdown_to_html_stream,
+    read_blocks,
 )
 
 class TestBlockMd2Text(unittest.TestCase):
@@ -219,3 +223,60 @@ Aesthetic
 
         self.assertEqual(html, expected)
 
+
+
+    def test_lexBlocks(self):
+        mdtext = """# Heading
+
+>A quote
+>on two lines
+
+1. An ordered list
+2. with items
+
+```
+code
+```
+"""
+        blocks = lex_blocks(mdtext)
+        block_types = [block.block_type for block in blocks]
+        line_ranges = [(block.start_line, block.end_line) for block in blocks]
+
+        self.assertListEqual(block_types, [
+            block_type_heading, block_type_quote,
+            block_type_orderedlist, block_type_code,
+        ])
+        self.assertListEqual(line_ranges, [(1, 1), (3, 4), (6, 7), (9, 12)])
+        self.assertListEqual(blocks[1].lines, [">A quote", ">on two lines"])
+
+
+    def test_lexBlocks_matchesBlockToBlockType(self):
+        mdtext = """> A quote
+not a quote
+
+* a list
+- with items
+
+```
+not closed
+
+###### Heading level 6"""
+        blocks = lex_blocks(mdtext)
+        self.assertListEqual(
+            [block.block_type for block in blocks],
+            [block_to_block_type(block) for block in markdown_to_blocks(mdtext)]
+        )
+
+
+    def test_readBlocks_matchesLexBlocks(self):
+        mdtext = "# Title\n\n\nstarts with a newline\n\n\n\n- a list\n- of items\n\n"
+        for text in (mdtext, mdtext + "\n", "", "\n", "one line"):
+            blocks = list(read_blocks(io.StringIO(text)))
+            self.assertListEqual(blocks, lex_blocks(text.removesuffix("\n")))
+
+
+    def test_markdownToHtmlStream(self):
+        mdtext = "# Title\n\nSome **bold** text\n\n```\ncode\n```\n"
+        parts = []
+        markdown_to_html_stream(read_blocks(io.StringIO(mdtext)), parts.append)
+        self.assertEqual("".join(parts), markdown_to_html_node(mdtext[:-1]).to_html())
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from buzz import BuildError, generate_pages_recursive
+from links import LinkIndex
+
+PAGES = 12
+
+class TestGeneratePagesRecursive(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = self.tmpdir.name
+        self.content = os.path.join(root, "content")
+        self.template = os.path.join(root, "template.html")
+        os.makedirs(os.path.join(self.content, "blog"))
+        self.__write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.pages = []
+        for i in range(PAGES):
+            rel_path = f"page-{i:02}.md" if i % 2 else os.path.join("blog", f"page-{i:02}.md")
+            self.__write(os.path.join(self.content, rel_path),
+                         f"# Page {i}\n\nSee [page {i}](/target-{i}).\n")
+            self.pages.append(rel_path)
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def __write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+    def __build(self, dest, jobs, link_index=None):
+        with redirect_stdout(StringIO()):
+            generate_pages_recursive(self.content, self.template, dest, jobs=jobs,
+                                     link_index=link_index)
+
+
+    def __read_tree(self, root):
+        files = {}
+        for dir_path, _, file_names in os.walk(root):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                with open(path, 'r') as f:
+                    files[os.path.relpath(path, root)] = f.read()
+        return files
+
+
+    def test_generatePages_poolMatchesSerialBuild(self):
+        serial = os.path.join(self.tmpdir.name, "serial")
+        pooled = os.path.join(self.tmpdir.name, "pooled")
+        self.__build(serial, jobs=1)
+        self.__build(pooled, jobs=3)
+        files = self.__read_tree(serial)
+        self.assertEqual(len(files), PAGES)
+        self.assertDictEqual(self.__read_tree(pooled), files)
+
+
+    def test_generatePages_poolResultsComeBackInOrder(self):
+        link_index = LinkIndex()
+        self.__build(os.path.join(self.tmpdir.name, "public"), jobs=4, link_index=link_index)
+        # the pages are found in sorted order, each one links to its own target
+        expected = sorted(self.pages)
+        urls = ["/" + rel_path.replace(os.sep, "/").removesuffix(".md") + ".html"
+                for rel_path in expected]
+        self.assertListEqual(list(link_index.outgoing), urls)
+        for url, rel_path in zip(urls, expected):
+            i = int(rel_path[-5:-3])
+            self.assertListEqual(link_index.outgoing[url], [("link", f"/target-{i}")])
+
+
+    def test_generatePages_poolCollectsErrors(self):
+        self.__write(os.path.join(self.content, "page-03.md"), "no title\n")
+        self.__write(os.path.join(self.content, "blog", "page-04.md"), "no title either\n")
+        public = os.path.join(self.tmpdir.name, "public")
+        with self.assertRaises(BuildError) as raised:
+            self.__build(public, jobs=3)
+
+        failed = sorted(os.path.relpath(path, self.content) for path, _ in raised.exception.errors)
+        self.assertListEqual(failed, [os.path.join("blog", "page-04.md"), "page-03.md"])
+        self.assertTrue(all(error.startswith("ValueError: No h1 header")
+                            for _, error in raised.exception.errors))
+        self.assertIn("2 page(s) failed to build", str(raised.exception))
+        # the other pages are still written
+        self.assertEqual(len(self.__read_tree(public)), PAGES - 2)
+
+
+    def test_generatePages_removesDeletedPagesWhenTemplateChanges(self):
+        public = os.path.join(self.tmpdir.name, "public")
+        manifest_path = os.path.join(self.tmpdir.name, "manifest.json")
+        with redirect_stdout(StringIO()):
+            generate_pages_recursive(self.content, self.template, public, manifest_path)
+        os.remove(os.path.join(self.content, "page-01.md"))
+        self.__write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        with redirect_stdout(StringIO()):
+            generate_pages_recursive(self.content, self.template, public, manifest_path)
+
+        files = self.__read_tree(public)
+        self.assertNotIn("page-01.html", files)
+        self.assertEqual(len(files), PAGES - 1)
+        self.assertTrue(all(html.startswith("<h1>") for html in files.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
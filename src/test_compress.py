@@ -0,0 +1,76 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from compress import MIN_SIZE, compress_dir, encoding_gzip, remove_compressed
+from manifest import BuildManifest
+
+class TestCompressDir(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmpdir.name, "public")
+        self.manifest = BuildManifest(os.path.join(self.tmpdir.name, "manifest.json"))
+        os.makedirs(os.path.join(self.root, "images"))
+        self.page = "<p>" + "buzz " * MIN_SIZE + "</p>"
+        self.__write(os.path.join(self.root, "index.html"), self.page)
+        self.__write(os.path.join(self.root, "tiny.css"), "body {}")
+        self.__write(os.path.join(self.root, "images", "logo.png"), "png " * MIN_SIZE)
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def __write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+    def test_compressDir_compressesTextFilesOnly(self):
+        stats = compress_dir(self.root, self.manifest, encodings=(encoding_gzip,))
+        self.assertEqual(stats.compressed, 1)
+        with gzip.open(os.path.join(self.root, "index.html.gz"), 'rt') as f:
+            self.assertEqual(f.read(), self.page)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "tiny.css.gz")))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "images", "logo.png.gz")))
+        self.assertLess(stats.ratio(encoding_gzip), 0.1)
+
+
+    def test_compressDir_skipsRewrittenButUnchangedFiles(self):
+        compress_dir(self.root, self.manifest, encodings=(encoding_gzip,))
+        self.__write(os.path.join(self.root, "index.html"), self.page)
+        os.utime(os.path.join(self.root, "index.html"), ns=(0, 0))
+
+        stats = compress_dir(self.root, self.manifest, encodings=(encoding_gzip,))
+        self.assertEqual((stats.compressed, stats.skipped), (0, 1))
+
+        self.__write(os.path.join(self.root, "index.html"), self.page + "<p>more</p>")
+        stats = compress_dir(self.root, self.manifest, encodings=(encoding_gzip,))
+        self.assertEqual((stats.compressed, stats.skipped), (1, 0))
+
+
+    def test_compressDir_removesStaleSiblings(self):
+        compress_dir(self.root, self.manifest, encodings=(encoding_gzip,))
+        os.remove(os.path.join(self.root, "index.html"))
+
+        stats = compress_dir(self.root, self.manifest, encodings=(encoding_gzip,))
+        self.assertEqual(stats.removed, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "index.html.gz")))
+
+
+    def test_compressDir_withoutManifest(self):
+        compress_dir(self.root, encodings=(encoding_gzip,))
+        stats = compress_dir(self.root, encodings=(encoding_gzip,))
+        self.assertEqual((stats.compressed, stats.skipped), (0, 1))
+
+
+    def test_removeCompressed(self):
+        compress_dir(self.root, self.manifest, encodings=(encoding_gzip,))
+        self.assertEqual(remove_compressed(self.root, self.manifest), 1)
+        self.assertEqual(self.manifest.compressed, {})
+        self.assertFalse(os.path.exists(os.path.join(self.root, "index.html.gz")))
+
+
+if __name__ == "__main__":
+    unittest.main()
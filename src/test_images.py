@@ -0,0 +1,204 @@
+import io
+import os
+import struct
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import images as images_module
+from buzz import generate_pages_recursive
+from images import ImagePipeline, can_make_variants, image_size, remove_variants
+from manifest import BuildManifest
+
+def png_bytes(width, height):
+    return (b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR"
+            + struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0) + b"\x00" * 16)
+
+
+class TestImageSize(unittest.TestCase):
+    def test_imageSize_png(self):
+        self.assertEqual(image_size(io.BytesIO(png_bytes(1344, 896))), (1344, 896))
+
+
+    def test_imageSize_gif(self):
+        data = b"GIF89a" + struct.pack("<HH", 320, 200) + b"\x00" * 32
+        self.assertEqual(image_size(io.BytesIO(data)), (320, 200))
+
+
+    def test_imageSize_jpeg(self):
+        # an APP0 segment is skipped over on the way to the frame header
+        app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+        sof = b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 600, 800) + b"\x00" * 10
+        data = b"\xff\xd8" + app0 + sof
+        self.assertEqual(image_size(io.BytesIO(data)), (800, 600))
+
+
+    def test_imageSize_webp(self):
+        chunk = b"VP8X" + struct.pack("<I", 10) + b"\x00" * 4
+        data = (b"RIFF" + struct.pack("<I", 30) + b"WEBP" + chunk
+                + (639).to_bytes(3, "little") + (479).to_bytes(3, "little"))
+        self.assertEqual(image_size(io.BytesIO(data)), (640, 480))
+
+
+    def test_imageSize_unknown(self):
+        self.assertIsNone(image_size(io.BytesIO(b"<svg></svg>")))
+
+
+class TestImagePipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmpdir.name, "static")
+        self.public = os.path.join(self.tmpdir.name, "public")
+        self.cache_dir = os.path.join(self.tmpdir.name, ".buzz-cache")
+        self.manifest = BuildManifest(os.path.join(self.tmpdir.name, "manifest.json"))
+        os.makedirs(os.path.join(self.static, "images"))
+        with open(os.path.join(self.static, "images", "logo.png"), 'wb') as f:
+            f.write(png_bytes(200, 100))
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def test_prepare_skipsUnchangedImages(self):
+        images = ImagePipeline(self.static, self.public, cache_dir=self.cache_dir)
+        stats = images.prepare(self.manifest)
+        self.assertEqual((stats.images, stats.processed), (1, 1))
+        self.assertEqual(images.images, {"/images/logo.png": (200, 100, [])})
+
+        images = ImagePipeline(self.static, self.public, cache_dir=self.cache_dir)
+        stats = images.prepare(self.manifest)
+        self.assertEqual((stats.processed, stats.skipped), (0, 1))
+        self.assertEqual(images.images, {"/images/logo.png": (200, 100, [])})
+
+
+    def test_rewriter(self):
+        images = ImagePipeline(self.static, self.public, cache_dir=self.cache_dir)
+        images.images = {"/images/logo.png": (200, 100, [("logo-100w.png", 100)])}
+        parts = []
+        write = images.rewriter(parts.append, "/blog/")
+        write('<p><img src="../images/logo.png" alt="logo"></img></p>')
+        write('<img src="https://www.boot.dev/logo.png" alt="boot.dev"></img>')
+        write('<img src="/images/logo.png" width="50">')
+        self.assertListEqual(parts, [
+            '<p><img src="../images/logo.png" alt="logo" width="200" height="100" '
+            'loading="lazy" decoding="async" srcset="../images/logo-100w.png 100w, '
+            '../images/logo.png 200w" sizes="(max-width: 200px) 100vw, 200px"></img></p>',
+            '<img src="https://www.boot.dev/logo.png" alt="boot.dev"></img>',
+            '<img src="/images/logo.png" width="50">',
+        ])
+
+
+    def test_rewriter_collectsReferences(self):
+        images = ImagePipeline(self.static, self.public, cache_dir=self.cache_dir)
+        images.images = {"/images/logo.png": (200, 100, [])}
+        references = {}
+        write = images.rewriter(lambda html: None, "/blog/", references)
+        write('<img src="../images/logo.png"><img src="missing.png"><img src="https://a.b/c.png">')
+        self.assertEqual(references, {"/images/logo.png": images.reference("/images/logo.png"),
+                                      "/blog/missing.png": None})
+        self.assertTrue(images.is_current(references))
+
+        images.images["/images/logo.png"] = (400, 200, [])
+        self.assertFalse(images.is_current(references))
+
+
+    def test_generatePages_rebuildsPagesOfChangedImages(self):
+        content = os.path.join(self.tmpdir.name, "content")
+        template = os.path.join(self.tmpdir.name, "template.html")
+        manifest_path = os.path.join(self.tmpdir.name, "manifest.json")
+        os.makedirs(content)
+        with open(template, 'w') as f:
+            f.write("{{ Content }}")
+        with open(os.path.join(content, "logo.md"), 'w') as f:
+            f.write("# Logo\n\n![logo](/images/logo.png)\n")
+        with open(os.path.join(content, "text.md"), 'w') as f:
+            f.write("# Text\n\nNo image here\n")
+
+        def build():
+            images = ImagePipeline(self.static, self.public, cache_dir=self.cache_dir)
+            manifest = BuildManifest.load(manifest_path)
+            images.prepare(manifest)
+            manifest.save()
+            output = StringIO()
+            with redirect_stdout(output):
+                generate_pages_recursive(content, template, self.public, manifest_path,
+                                         images=images)
+            return output.getvalue().count("Generating page")
+
+        self.assertEqual(build(), 2)
+        self.assertEqual(build(), 0)
+        with open(os.path.join(self.static, "images", "logo.png"), 'wb') as f:
+            f.write(png_bytes(400, 200))
+        self.assertEqual(build(), 1)
+        with open(os.path.join(self.public, "logo.html"), 'r') as f:
+            self.assertIn('width="400" height="200"', f.read())
+
+
+    def test_prepare_resizesCopiesOfAnImageAtOnce(self):
+        # both copies reach the same cache path, their resizes are made to overlap
+        barrier = threading.Barrier(2, timeout=1)
+
+        class Resized():
+            def save(self, path, format, **options):
+                with open(path, 'wb') as f:
+                    f.write(b"small")
+                try:
+                    barrier.wait()
+                except threading.BrokenBarrierError:
+                    pass
+
+        class Opened():
+            format = "PNG"
+            def __enter__(self):
+                return self
+            def __exit__(self, *exc_info):
+                return False
+            def resize(self, size, resample):
+                return Resized()
+
+        fake_image = SimpleNamespace(open=lambda path: Opened(),
+                                     Resampling=SimpleNamespace(LANCZOS=1))
+        os.makedirs(os.path.join(self.static, "copy"))
+        with open(os.path.join(self.static, "copy", "logo.png"), 'wb') as f:
+            f.write(png_bytes(200, 100))
+        with patch.object(images_module, "Image", fake_image):
+            images = ImagePipeline(self.static, self.public, (100,), self.cache_dir)
+            stats = images.prepare(self.manifest, workers=4)
+        self.assertEqual(stats.variants, 2)
+        for name in ("images/logo-100w.png", "copy/logo-100w.png"):
+            with open(os.path.join(self.public, name), 'rb') as f:
+                self.assertEqual(f.read(), b"small")
+        self.assertListEqual([name for name in os.listdir(os.path.join(self.cache_dir, "images"))
+                              if name.endswith(".tmp")], [])
+
+
+    @unittest.skipUnless(can_make_variants(), "Pillow is not installed")
+    def test_prepare_makesVariants(self):
+        from PIL import Image
+        logo = os.path.join(self.static, "images", "logo.png")
+        Image.effect_noise((200, 100), 64).save(logo)
+
+        images = ImagePipeline(self.static, self.public, (50, 100, 400), self.cache_dir)
+        stats = images.prepare(self.manifest)
+        self.assertEqual((stats.variants, stats.resized), (2, 2))
+        self.assertEqual(images.images["/images/logo.png"],
+                         (200, 100, [("logo-50w.png", 50), ("logo-100w.png", 100)]))
+        with Image.open(os.path.join(self.public, "images", "logo-50w.png")) as variant:
+            self.assertEqual(variant.size, (50, 25))
+
+        # variants come from the cache when an image is touched but not modified
+        os.utime(logo, ns=(0, 0))
+        stats = images.prepare(self.manifest)
+        self.assertEqual((stats.processed, stats.resized), (1, 0))
+
+        self.assertEqual(remove_variants(self.public, self.manifest), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.public, "images", "logo-50w.png")))
+
+
+if __name__ == "__main__":
+    unittest.main()
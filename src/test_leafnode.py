@@ -36,3 +36,9 @@ class TestLeafNode(unittest.TestCase):
         expected = f'<a href="{alink}">{atext}</a>'
         self.assertEqual(expected, node.to_html())
 
+
+
+    def test_nodeHasNoInstanceDict(self):
+        node = LeafNode("b", "Bold text")
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertEqual(node.children, None)
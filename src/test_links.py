@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from block_md2text import markdown_to_html_node
+from leafnode import LeafNode
+from links import LinkIndex, collect_links, resolve_target
+
+class TestLinks(unittest.TestCase):
+    def test_collectLinks(self):
+        node = markdown_to_html_node(
+            "See [home](/) and ![logo](/images/logo.png)\n\n- [a page](page.html)")
+        links = []
+        collect_links(node, links)
+        self.assertListEqual(links, [
+            ("link", "/"), ("image", "/images/logo.png"), ("link", "page.html"),
+        ])
+
+        rendered = []
+        collect_links(LeafNode(None, node.to_html()), rendered)
+        self.assertListEqual(rendered, links)
+
+
+    def test_resolveTarget(self):
+        self.assertEqual(resolve_target("/blog/", "post.html#top"), "/blog/post.html")
+        self.assertEqual(resolve_target("/blog/post.html", "../images/a%20b.png"),
+                         "/images/a b.png")
+        self.assertEqual(resolve_target("/", "/blog/"), "/blog/")
+        self.assertIsNone(resolve_target("/", "https://www.boot.dev"))
+        self.assertIsNone(resolve_target("/", "mailto:buzz@example.com"))
+        self.assertIsNone(resolve_target("/", "#top"))
+
+
+class TestLinkIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.public = os.path.join(self.tmpdir.name, "public")
+        self.static = os.path.join(self.tmpdir.name, "static")
+        os.makedirs(os.path.join(self.public, "blog"))
+        os.makedirs(os.path.join(self.static, "images"))
+        for path in (os.path.join(self.public, "index.html"),
+                     os.path.join(self.public, "blog", "index.html"),
+                     os.path.join(self.public, "about.html"),
+                     os.path.join(self.static, "images", "logo.png")):
+            with open(path, 'w') as f:
+                f.write("")
+
+        self.index = LinkIndex()
+        self.index.add("/", [("link", "/blog"), ("image", "/images/logo.png")])
+        self.index.add("/blog/", [("link", "/"), ("link", "missing.html"),
+                                  ("link", "https://www.boot.dev")])
+        self.index.add("/about.html", [("link", "/about.html")])
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def test_linkIndex_incoming(self):
+        self.assertEqual(self.index.incoming["/blog"], {"/"})
+        self.assertEqual(self.index.incoming["/blog/missing.html"], {"/blog/"})
+
+
+    def test_linkIndex_validate(self):
+        self.assertListEqual(self.index.validate(self.public, self.static),
+                             [("/blog/", "link", "missing.html")])
+
+
+    def test_linkIndex_orphans(self):
+        # a page linking to itself is still an orphan
+        self.assertListEqual(self.index.orphans(), ["/about.html"])
+
+
+if __name__ == "__main__":
+    unittest.main()
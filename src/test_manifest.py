@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+from manifest import BuildManifest, hash_file, stat_and_hash
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        self.src = os.path.join(self.root, "index.md")
+        self.dest = os.path.join(self.root, "index.html")
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        self.__write(self.src, "# Title\n")
+        self.__write(self.dest, "<html></html>")
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def __write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+    def test_isStale_whenPageIsUnknown(self):
+        manifest = BuildManifest(self.manifest_path)
+        self.assertTrue(manifest.is_stale(self.src, self.dest))
+
+
+    def test_isStale_whenPageIsRecorded(self):
+        manifest = BuildManifest(self.manifest_path)
+        manifest.record(self.src, self.dest)
+        self.assertFalse(manifest.is_stale(self.src, self.dest))
+
+
+    def test_isStale_whenSourceChangesMidBuild(self):
+        manifest = BuildManifest(self.manifest_path)
+        stat, content_hash = stat_and_hash(self.src)
+        self.__write(self.src, "# Edited while building\n")
+        os.utime(self.src, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        manifest.record(self.src, self.dest, content_hash, stat=stat)
+        self.assertTrue(manifest.is_stale(self.src, self.dest))
+
+
+    def test_isStale_whenSourceChanges(self):
+        manifest = BuildManifest(self.manifest_path)
+        manifest.record(self.src, self.dest)
+        self.__write(self.src, "# Another title\n")
+        self.assertTrue(manifest.is_stale(self.src, self.dest))
+
+
+    def test_isStale_whenSourceIsTouchedButUnchanged(self):
+        manifest = BuildManifest(self.manifest_path)
+        manifest.record(self.src, self.dest)
+        stat = os.stat(self.src)
+        os.utime(self.src, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertFalse(manifest.is_stale(self.src, self.dest))
+
+
+    def test_isStale_whenOutputIsMissing(self):
+        manifest = BuildManifest(self.manifest_path)
+        manifest.record(self.src, self.dest)
+        os.remove(self.dest)
+        self.assertTrue(manifest.is_stale(self.src, self.dest))
+
+
+    def test_setTemplate_whenTemplateChanges(self):
+        manifest = BuildManifest(self.manifest_path)
+        manifest.set_template("abc")
+        manifest.record(self.src, self.dest)
+        manifest.set_template("def")
+        self.assertTrue(manifest.is_stale(self.src, self.dest))
+
+
+    def test_saveAndLoad(self):
+        manifest = BuildManifest(self.manifest_path)
+        manifest.set_template("abc")
+        manifest.record(self.src, self.dest)
+        manifest.save()
+
+        loaded = BuildManifest.load(self.manifest_path)
+        self.assertEqual(loaded.template_hash, "abc")
+        self.assertEqual(loaded.pages, manifest.pages)
+        self.assertEqual(loaded.pages[os.path.normpath(self.src)]["hash"],
+                         hash_file(self.src))
+
+
+    def test_removeMissing(self):
+        manifest = BuildManifest(self.manifest_path)
+        manifest.record(self.src, self.dest)
+        removed = manifest.remove_missing([])
+        self.assertEqual(removed, [os.path.normpath(self.dest)])
+        self.assertEqual(manifest.pages, {})
@@ -332,3 +332,44 @@ class TestMd2Text(unittest.TestCase):
         ]
         self.assertEqual(nodes, expected)
 
+
+
+    def test_textToTextNodes_withMarkupInsideCode(self):
+        text = "Use `**kwargs` and `[a](b)` in *Python*"
+        nodes = text_to_text_nodes(text)
+        expected = [
+            TextNode("Use ", text_type_text),
+            TextNode("**kwargs", text_type_code),
+            TextNode(" and ", text_type_text),
+            TextNode("[a](b)", text_type_code),
+            TextNode(" in ", text_type_text),
+            TextNode("Python", text_type_italic),
+        ]
+        self.assertEqual(nodes, expected)
+
+
+    def test_textToTextNodes_withLinkInsideBold(self):
+        text = "**read the [docs](https://example.com) first**"
+        nodes = text_to_text_nodes(text)
+        expected = [
+            TextNode("read the ", text_type_bold),
+            TextNode("docs", text_type_link, "https://example.com"),
+            TextNode(" first", text_type_bold),
+        ]
+        self.assertEqual(nodes, expected)
+
+
+    def test_textToTextNodes_withUnmatchedBrackets(self):
+        text = "An [aside] then a [link](https://example.com) and ![broken"
+        nodes = text_to_text_nodes(text)
+        expected = [
+            TextNode("An [aside] then a ", text_type_text),
+            TextNode("link", text_type_link, "https://example.com"),
+            TextNode(" and ![broken", text_type_text),
+        ]
+        self.assertEqual(nodes, expected)
+
+
+    def test_textToTextNodes_whenFormattedTextIsNotClosed(self):
+        self.assertRaises(ValueError, text_to_text_nodes, "This is **not closed")
+        self.assertRaises(ValueError, text_to_text_nodes, "This is `not closed")
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import output
+from manifest import BuildManifest
+from output import TMP_SUFFIX, OutputWriter, publish_dir, stage_dir
+
+class TestOutputWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.writer = OutputWriter(self.tmpdir.name)
+        self.path = os.path.join(self.tmpdir.name, "a", "b", "index.html")
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def __write(self, *parts):
+        page = self.writer.open(self.path)
+        for part in parts:
+            page.write(part)
+        return page.commit()
+
+
+    def __read(self, path):
+        with open(path, 'r') as f:
+            return f.read()
+
+
+    def test_commit_writesWholeFile(self):
+        self.assertTrue(self.__write("<p>", "home", "</p>"))
+        self.assertEqual(self.__read(self.path), "<p>home</p>")
+        self.assertFalse(os.path.exists(self.path + TMP_SUFFIX))
+        self.assertIn(os.path.dirname(self.path), self.writer.created_dirs)
+        self.assertDictEqual(self.writer.take_stats(),
+                             {"written": 1, "unchanged": 0, "bytes_written": 11})
+
+
+    def test_commit_skipsUnchangedContent(self):
+        self.__write("<p>home</p>")
+        os.utime(self.path, ns=(1, 1))
+        self.assertFalse(self.__write("<p>", "home</p>"))
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 1)
+
+        self.assertTrue(self.__write("<p>changed</p>"))
+        self.assertEqual(self.__read(self.path), "<p>changed</p>")
+        self.assertEqual((self.writer.written, self.writer.unchanged), (2, 1))
+
+
+    def test_commit_spillsLargePages(self):
+        with patch.object(output, "SPILL_CHARS", 8):
+            self.assertTrue(self.__write("<p>", "large page", "</p>"))
+            self.assertFalse(self.__write("<p>large ", "page</p>"))
+        self.assertEqual(self.__read(self.path), "<p>large page</p>")
+        self.assertEqual((self.writer.written, self.writer.unchanged), (1, 1))
+
+
+    def test_abort_keepsPreviousFile(self):
+        self.__write("<p>home</p>")
+        with patch.object(output, "SPILL_CHARS", 8):
+            page = self.writer.open(self.path)
+            page.write("<p>half written")
+            page.abort()
+        self.assertEqual(self.__read(self.path), "<p>home</p>")
+        self.assertFalse(os.path.exists(self.path + TMP_SUFFIX))
+
+
+class TestPublishDir(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.public = os.path.join(self.tmpdir.name, "public")
+        os.makedirs(os.path.join(self.public, "a"))
+        with open(os.path.join(self.public, "a", "index.html"), 'w') as f:
+            f.write("<p>old</p>")
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def test_stageAndPublish(self):
+        staging = stage_dir(self.public)
+        staged_path = os.path.join(staging, "a", "index.html")
+        self.assertTrue(os.path.samefile(staged_path, os.path.join(self.public, "a", "index.html")))
+
+        page = OutputWriter(staging).open(staged_path)
+        page.write("<p>new</p>")
+        page.commit()
+        with open(os.path.join(self.public, "a", "index.html"), 'r') as f:
+            self.assertEqual(f.read(), "<p>old</p>")
+
+        publish_dir(staging, self.public)
+        with open(os.path.join(self.public, "a", "index.html"), 'r') as f:
+            self.assertEqual(f.read(), "<p>new</p>")
+        self.assertListEqual(os.listdir(self.tmpdir.name), ["public"])
+
+
+    def test_rebaseOutputs(self):
+        manifest = BuildManifest(os.path.join(self.tmpdir.name, "manifest.json"))
+        manifest.pages["content/a.md"] = {"output": os.path.join("public.staging", "a.html")}
+        manifest.pages["content/b.md"] = {"output": os.path.join("public.staged", "b.html")}
+        manifest.rebase_outputs("./public.staging/", "./public/")
+        self.assertEqual(manifest.pages["content/a.md"]["output"], os.path.join("public", "a.html"))
+        self.assertEqual(manifest.pages["content/b.md"]["output"],
+                         os.path.join("public.staged", "b.html"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -246,3 +246,24 @@ class TestParentNode(unittest.TestCase):
         self.assertEqual(expected, node.to_html())
 
 
+
+
+    def test_renderInto_writesSameHtmlAsToHTML(self):
+        node = ParentNode(
+            "ul",
+            [
+                ParentNode("li", [LeafNode("b", "Bold text"), LeafNode(None, " item")]),
+                ParentNode("li", [LeafNode("a", "link", { "href": "#" })]),
+            ],
+            { "class": "list" }
+        )
+
+        fragments = []
+        node.render_into(fragments.append)
+
+        self.assertGreater(len(fragments), 1)
+        self.assertEqual(node.to_html(), "".join(fragments))
+        self.assertEqual(
+            '<ul class="list"><li><b>Bold text</b> item</li><li><a href="#">link</a></li></ul>',
+            node.to_html()
+        )
@@ -0,0 +1,62 @@
+import unittest
+
+from block_md2text import markdown_to_html_node
+from profiler import NULL_PROFILER, BuildProfiler
+
+class TestBuildProfiler(unittest.TestCase):
+    def test_add_isAccountedToCurrentPage(self):
+        profiler = BuildProfiler()
+        profiler.add("discover", 1.0)
+        profiler.start_page("a.md")
+        profiler.add("read", 0.5)
+        profiler.add("read", 0.25)
+        profiler.end_page()
+
+        self.assertEqual(profiler.stages, {"discover": 1.0, "read": 0.75})
+        self.assertEqual(profiler.pages["a.md"]["stages"], {"read": 0.75})
+
+
+    def test_stage(self):
+        profiler = BuildProfiler()
+        with profiler.stage("render"):
+            pass
+        self.assertIn("render", profiler.stages)
+
+
+    def test_merge(self):
+        profiler = BuildProfiler()
+        profiler.add("read", 1.0)
+
+        worker = BuildProfiler()
+        worker.start_page("b.md")
+        worker.add("read", 2.0)
+        worker.end_page()
+        profiler.merge(worker.to_dict())
+
+        self.assertEqual(profiler.stages, {"read": 3.0})
+        self.assertIn("b.md", profiler.pages)
+
+
+    def test_report_listsSlowestPages(self):
+        profiler = BuildProfiler()
+        for page in ("fast.md", "slow.md"):
+            profiler.start_page(page)
+            profiler.add("inline", 0.1)
+            profiler.end_page()
+        profiler.pages["slow.md"]["total"] = 5.0
+
+        report = profiler.report(slowest=1)
+        self.assertIn("slow.md", report)
+        self.assertNotIn("fast.md", report)
+        self.assertIn("inline", report)
+
+
+    def test_markdownToHtmlNode_recordsParseStages(self):
+        profiler = BuildProfiler()
+        markdown_to_html_node("# Title\n\nSome **bold** text", profiler)
+        self.assertEqual(set(profiler.stages), {"blocks", "inline", "html"})
+
+
+    def test_nullProfiler(self):
+        with NULL_PROFILER.stage("read"):
+            NULL_PROFILER.add("read", 1.0)
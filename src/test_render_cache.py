@@ -0,0 +1,126 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from block_md2text import markdown_to_html_node
+from leafnode import LeafNode
+from render_cache import FLUSH_ENTRIES, MIN_BLOCK_LENGTH, BlockMemo, RenderCache, block_key, document_key
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, ".buzz-cache")
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def test_renderCache_keepsEntriesAcrossInstances(self):
+        cache = RenderCache(self.cache_dir)
+        cache.put("doc:a", "<div></div>")
+        self.assertEqual(cache.get("doc:a"), "<div></div>")
+        cache.close()
+
+        cache = RenderCache(self.cache_dir)
+        self.assertEqual(cache.get_many(["doc:a", "doc:b"]), {"doc:a": "<div></div>"})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        cache.close()
+
+
+    def test_renderCache_evictsLeastRecentlyUsedEntries(self):
+        cache = RenderCache(self.cache_dir, max_bytes=10)
+        cache.put("old", "12345")
+        cache.flush()
+        cache.put("new", "12345")
+        cache.flush()
+        cache.get("old")
+        cache.put("newest", "12345")
+
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual(cache.get_many(["old", "new", "newest"]).keys(), {"old", "newest"})
+        self.assertEqual(cache.size(), 10)
+        cache.close()
+
+
+    def test_renderCache_mergesWhatWorkersTake(self):
+        cache = RenderCache(self.cache_dir)
+        worker = pickle.loads(pickle.dumps(cache))
+        worker.get("doc:a")
+        worker.put("doc:a", "<div></div>")
+
+        cache.merge(worker.take_pending())
+        self.assertEqual(worker.pending, {})
+        self.assertEqual(cache.misses, 1)
+        cache.close()
+        self.assertEqual(RenderCache(self.cache_dir).get("doc:a"), "<div></div>")
+
+
+    def test_renderCache_workersNeverWrite(self):
+        worker = pickle.loads(pickle.dumps(RenderCache(self.cache_dir)))
+        worker.put_many({f"block:{i}": "<p></p>" for i in range(FLUSH_ENTRIES + 1)})
+        self.assertEqual(len(worker.pending), FLUSH_ENTRIES + 1)
+        self.assertFalse(os.path.exists(worker.path))
+
+
+    def test_markdownToHtmlNode_withCache(self):
+        footer = "This page is licensed under the *same* terms as " + "buzz " * MIN_BLOCK_LENGTH
+        markdown = f"# Title\n\n{footer}\n\n- one\n- two"
+        expected = markdown_to_html_node(markdown).to_html()
+
+        cache = RenderCache(self.cache_dir)
+        self.assertEqual(markdown_to_html_node(markdown, cache=cache).to_html(), expected)
+        self.assertIn(block_key(footer), cache.pending)
+        self.assertIn(document_key(markdown), cache.pending)
+        cache.close()
+
+        cache = RenderCache(self.cache_dir)
+        self.assertEqual(markdown_to_html_node(markdown, cache=cache).to_html(), expected)
+        self.assertEqual(cache.hits, 1)
+
+        other = f"# Other\n\n{footer}"
+        self.assertEqual(markdown_to_html_node(other, cache=cache).to_html(),
+                         markdown_to_html_node(other).to_html())
+        self.assertEqual(cache.hits, 2)
+        cache.close()
+
+
+class TestBlockMemo(unittest.TestCase):
+    def test_blockMemo_rendersBlocksSeenTwice(self):
+        memo = BlockMemo(max_entries=2)
+        node = LeafNode("b", "bold")
+        self.assertIs(memo.put("**bold**", node), node)
+        self.assertIsNone(memo.get("**bold**"))
+
+        self.assertEqual(memo.put("**bold**", node).to_html(), "<b>bold</b>")
+        self.assertEqual(memo.get("**bold**"), "<b>bold</b>")
+        self.assertEqual((memo.hits, memo.misses), (1, 1))
+
+
+    def test_blockMemo_evictsLeastRecentlyUsedBlocks(self):
+        memo = BlockMemo(max_entries=2)
+        for text in ("a", "a", "b", "b"):
+            memo.put(text, LeafNode(None, text))
+        memo.get("a")
+        memo.put("c", LeafNode(None, "c"))
+        self.assertEqual(list(memo.entries), ["a", "c"])
+
+
+    def test_blockMemo_isSharedByEveryJobOfAProcess(self):
+        memo = BlockMemo(max_entries=3)
+        self.assertIs(pickle.loads(pickle.dumps(memo)), pickle.loads(pickle.dumps(memo)))
+        self.assertEqual(memo.take_stats(), {"hits": 0, "misses": 0})
+
+
+    def test_markdownToHtmlNode_withMemo(self):
+        memo = BlockMemo()
+        markdown = "# Title\n\nSee [the license](/license).\n\n- one\n- two"
+        expected = markdown_to_html_node(markdown).to_html()
+        for _ in range(3):
+            self.assertEqual(markdown_to_html_node(markdown, memo=memo).to_html(), expected)
+        self.assertEqual((memo.hits, memo.misses), (3, 6))
+
+
+if __name__ == "__main__":
+    unittest.main()
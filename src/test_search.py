@@ -0,0 +1,125 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from search import (
+    MAX_POSITIONS,
+    SEARCH_DIR,
+    PageIndexer,
+    SearchIndex,
+    remove_index,
+    term_hash,
+    tokenize,
+)
+
+def index_pieces(pieces, title=""):
+    indexer = PageIndexer(title)
+    for piece in pieces:
+        indexer.feed(piece)
+    return indexer.to_document()
+
+
+class TestPageIndexer(unittest.TestCase):
+    def test_pageIndexer_positions(self):
+        document = index_pieces(["<h1>The Ring</h1><p>the ring of power</p>"], "The Ring")
+        self.assertEqual(document["title"], "The Ring")
+        self.assertDictEqual(document["terms"], {
+            "the": [2, 0, 2], "ring": [2, 1, 3], "of": [1, 4], "power": [1, 5],
+        })
+
+
+    def test_pageIndexer_piecesAndTags(self):
+        # tags and words cut across writes, inline tags inside words, blocks between them
+        document = index_pieces([
+            "<p>sau", "ron</p><p cla", 'ss="x">mor<b>d</b>or</p><ul><li>one</li><li>two',
+            "</li></ul><script>var hidden = 1;</script>&amp; elves",
+        ])
+        self.assertListEqual(list(document["terms"]),
+                             ["sauron", "mordor", "one", "two", "elves"])
+
+
+    def test_pageIndexer_keepsFirstPositions(self):
+        document = index_pieces(["<p>" + "ring " * (MAX_POSITIONS + 4) + "</p>"])
+        count, *positions = document["terms"]["ring"]
+        self.assertEqual(count, MAX_POSITIONS + 4)
+        self.assertListEqual(positions, list(range(MAX_POSITIONS)))
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.public = os.path.join(self.tmpdir.name, "public")
+        self.index = SearchIndex(os.path.join(self.tmpdir.name, ".buzz-cache"))
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def __read(self, name):
+        with gzip.open(os.path.join(self.public, SEARCH_DIR, name), 'rt') as f:
+            return json.load(f)
+
+
+    def test_tokenize(self):
+        self.assertListEqual(tokenize("Élan, Ring-bearer's 3rd"),
+                             ["élan", "ring", "bearer", "s", "3rd"])
+        self.assertEqual(term_hash("a"), 0xE40C292C)
+
+
+    def test_searchIndex_write(self):
+        self.index.add("/b/", index_pieces(["<p>ring ring</p>"], "Rings"))
+        self.index.add("/", index_pieces(["<p>the one ring</p>"], "Home"))
+        stats = self.index.write(self.public)
+        self.assertEqual((stats.pages, stats.terms, stats.shards), (2, 5, 1))
+
+        meta = self.__read("pages.json.gz")
+        self.assertListEqual(meta["pages"], [["/", "Home"], ["/b/", "Rings"]])
+        shard = self.__read("shard-0.json.gz")
+        # page 0 at position 2, then page 0 + 1 twice, at 0 and 0 + 1
+        self.assertListEqual(shard["ring"], [0, 0, 1, 2, 1, 0, 2, 0, 1])
+        # in the title of page 0 only
+        self.assertListEqual(shard["home"], [0, 1, 0])
+        self.assertTrue(os.path.exists(os.path.join(self.public, SEARCH_DIR, "search.js")))
+
+        self.assertTrue(remove_index(self.public))
+        self.assertFalse(os.path.exists(os.path.join(self.public, SEARCH_DIR)))
+
+
+    def test_searchIndex_writesChangedFilesOnly(self):
+        for i in range(40):
+            self.index.add(f"/{i}/", index_pieces([f"<p>word{i} ring</p>"], f"Page {i}"))
+        self.index.shard_size = 64
+        stats = self.index.write(self.public)
+        self.assertGreater(stats.shards, 2)
+        index_dir = os.path.join(self.public, SEARCH_DIR)
+        for name in os.listdir(index_dir):
+            os.utime(os.path.join(index_dir, name), ns=(1, 1))
+
+        stats = self.index.write(self.public)
+        self.assertEqual((stats.written, stats.unchanged), (0, stats.shards + 2))
+        self.assertTrue(all(os.stat(os.path.join(index_dir, name)).st_mtime_ns == 1
+                            for name in os.listdir(index_dir)))
+
+        # fewer shards, the others are removed
+        self.index.shard_size = 1 << 20
+        stats = self.index.write(self.public)
+        self.assertEqual(stats.shards, 1)
+        self.assertListEqual(sorted(os.listdir(index_dir)),
+                             ["pages.json.gz", "search.js", "shard-0.json.gz"])
+
+
+    def test_searchIndex_storesDocuments(self):
+        document = index_pieces(["<p>the one ring</p>"], "Home")
+        document_hash = self.index.store_document(document)
+        self.assertEqual(self.index.load_document(document_hash), document)
+        self.assertIsNone(self.index.load_document("missing"))
+
+        self.assertEqual(self.index.prune_store([]), 1)
+        self.assertIsNone(self.index.load_document(document_hash))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,369 @@
+import asyncio
+import email.utils
+import gzip
+import http.client
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import HTTPServer
+from unittest.mock import patch
+
+# server.py lives next to src/, it is run on its own rather than imported by the build
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+from server import (
+    AsyncHTTPServer,
+    BoundedThreadingHTTPServer,
+    CachingHTTPRequestHandler,
+    FileCache,
+    accepted_encodings,
+    is_not_modified,
+    parse_range,
+    range_applies,
+    range_unsatisfiable,
+    select_variant,
+)
+
+STYLE = b"body { margin: 0 }\n" * 64
+
+def write_site(root):
+    os.makedirs(os.path.join(root, "post"))
+    with open(os.path.join(root, "index.html"), 'w') as f:
+        f.write("<p>home</p>")
+    with open(os.path.join(root, "post", "index.html"), 'w') as f:
+        f.write("<p>post</p>")
+    with open(os.path.join(root, "style.css"), 'wb') as f:
+        f.write(STYLE)
+    with open(os.path.join(root, "style.css.gz"), 'wb') as f:
+        f.write(gzip.compress(STYLE))
+    # as compress.py leaves it, carrying the mtime of its original
+    set_mtime_like(os.path.join(root, "style.css.gz"), os.path.join(root, "style.css"))
+
+
+def set_mtime_like(path, original):
+    stat = os.stat(original)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+class TestHeaders(unittest.TestCase):
+    def test_parseRange(self):
+        self.assertEqual(parse_range("bytes=0-3", 10), (0, 4))
+        self.assertEqual(parse_range("bytes=5-", 10), (5, 5))
+        self.assertEqual(parse_range("bytes=8-20", 10), (8, 2))
+        self.assertEqual(parse_range("bytes=10-", 10), range_unsatisfiable)
+        self.assertIsNone(parse_range("bytes=3-1", 10))
+
+
+    def test_parseRange_suffix(self):
+        self.assertEqual(parse_range("bytes=-3", 10), (7, 3))
+        self.assertEqual(parse_range("bytes=-20", 10), (0, 10))
+        self.assertEqual(parse_range("bytes=-0", 10), range_unsatisfiable)
+
+
+    def test_parseRange_whenIgnored(self):
+        for header in ("bytes=0-1,4-5", "items=0-1", "bytes=a-b", "bytes=-", "bytes=4"):
+            self.assertIsNone(parse_range(header, 10), header)
+
+
+    def test_isNotModified(self):
+        mtime = 1_700_000_000.5
+        date = email.utils.formatdate(mtime, usegmt=True)
+        earlier = email.utils.formatdate(mtime - 60, usegmt=True)
+        self.assertTrue(is_not_modified('"b", W/"a"', None, '"a"', mtime))
+        self.assertTrue(is_not_modified("*", None, '"a"', mtime))
+        # If-None-Match wins over a matching If-Modified-Since
+        self.assertFalse(is_not_modified('"b"', date, '"a"', mtime))
+        self.assertTrue(is_not_modified(None, date, '"a"', mtime))
+        self.assertFalse(is_not_modified(None, earlier, '"a"', mtime))
+        self.assertFalse(is_not_modified(None, "yesterday", '"a"', mtime))
+        self.assertFalse(is_not_modified(None, None, '"a"', mtime))
+
+
+    def test_rangeApplies(self):
+        mtime = 1_700_000_000.5
+        self.assertTrue(range_applies(None, '"a"', mtime))
+        self.assertTrue(range_applies('"a"', '"a"', mtime))
+        self.assertFalse(range_applies('W/"a"', '"a"', mtime))
+        self.assertFalse(range_applies('"a"', None, mtime))
+        self.assertTrue(range_applies(email.utils.formatdate(mtime, usegmt=True), None, mtime))
+        self.assertFalse(range_applies(email.utils.formatdate(mtime + 60, usegmt=True), None,
+                                       mtime))
+        self.assertFalse(range_applies("yesterday", '"a"', mtime))
+
+
+    def test_acceptedEncodings(self):
+        self.assertEqual(accepted_encodings("gzip, br;q=0, Deflate;q=0.5, *;q=0, x;q=?"),
+                         {"gzip", "deflate"})
+        self.assertEqual(accepted_encodings(""), set())
+
+
+    def test_selectVariant(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "a.css")
+            for suffix in ("", ".gz", ".br"):
+                open(path + suffix, 'w').close()
+                set_mtime_like(path + suffix, path)
+            self.assertEqual(select_variant(path, "gzip, br"), (path + ".br", "br"))
+            self.assertEqual(select_variant(path, "br;q=0, gzip"), (path + ".gz", "gzip"))
+            self.assertEqual(select_variant(path, "*"), (path + ".br", "br"))
+            self.assertEqual(select_variant(path, "deflate"), (path, None))
+            os.remove(path + ".br")
+            self.assertEqual(select_variant(path, "br, gzip"), (path + ".gz", "gzip"))
+
+
+    def test_selectVariant_skipsStaleSiblings(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "a.css")
+            for suffix in ("", ".gz", ".br"):
+                open(path + suffix, 'w').close()
+                set_mtime_like(path + suffix, path)
+            # the original was edited after it was compressed
+            stat = os.stat(path)
+            os.utime(path + ".br", ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+            self.assertEqual(select_variant(path, "br, gzip"), (path + ".gz", "gzip"))
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertEqual(select_variant(path, "br, gzip"), (path, None))
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        write_site(self.tmpdir.name)
+        self.path = os.path.join(self.tmpdir.name, "style.css")
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def test_load_keepsSiblings(self):
+        cache = FileCache(1 << 20)
+        cached = cache.load("/style.css", self.path, "text/css")
+        self.assertEqual(set(cached.variants), {None, "gzip"})
+        self.assertEqual(cached.select("gzip, br"), "gzip")
+        self.assertIsNone(cached.select("gzip;q=0"))
+        self.assertIs(cache.get("/style.css"), cached)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+
+    def test_load_skipsStaleSiblings(self):
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        cached = FileCache(1 << 20).load("/style.css", self.path, "text/css")
+        self.assertEqual(set(cached.variants), {None})
+
+
+    def test_get_revalidatesChangedFiles(self):
+        cache = FileCache(1 << 20, revalidate_after=0)
+        cache.load("/style.css", self.path, "text/css")
+        with open(self.path, 'wb') as f:
+            f.write(b"body {}")
+        self.assertIsNone(cache.get("/style.css"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+        cached = cache.load("/style.css", self.path, "text/css")
+        self.assertEqual(cached.variants[None][0], b"body {}")
+
+
+    def test_load_evictsLeastRecentlyUsed(self):
+        cache = FileCache(len(STYLE) + 64, max_file_bytes=len(STYLE))
+        cache.load("/", os.path.join(self.tmpdir.name, "index.html"), "text/html")
+        cache.load("/post/", os.path.join(self.tmpdir.name, "post", "index.html"), "text/html")
+        cache.get("/")
+        cache.load("/style.css", self.path, "text/css")
+        self.assertListEqual(list(cache.entries), ["/", "/style.css"])
+        self.assertIsNone(FileCache(1 << 20, max_file_bytes=8).load("/style.css", self.path,
+                                                                     "text/css"))
+
+
+class TestRequestHandler(unittest.TestCase):
+    server_class = HTTPServer
+    cache_size = 0
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        write_site(self.tmpdir.name)
+        self.file_cache = None
+        if self.cache_size:
+            self.file_cache = FileCache(self.cache_size, revalidate_after=60)
+        handler_class = type("Handler", (CachingHTTPRequestHandler,),
+                             {"file_cache": self.file_cache, "log_message": lambda *args: None,
+                              "protocol_version": "HTTP/1.1"})
+        self.httpd = self.server_class(("127.0.0.1", 0),
+                                       partial(handler_class, directory=self.tmpdir.name))
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.tmpdir.cleanup()
+
+
+    def request(self, target, headers=None):
+        connection = http.client.HTTPConnection("127.0.0.1", self.httpd.server_address[1])
+        try:
+            connection.request("GET", target, headers=headers or {})
+            response = connection.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            connection.close()
+
+
+    def test_notModified(self):
+        status, headers, _ = self.request("/post/")
+        self.assertEqual(status, 200)
+        status, _, body = self.request("/post/", {"If-None-Match": headers["ETag"]})
+        self.assertEqual((status, body), (304, b""))
+
+
+    def test_precompressedSibling(self):
+        status, headers, body = self.request("/style.css", {"Accept-Encoding": "gzip"})
+        self.assertEqual((status, headers["Content-Encoding"]), (200, "gzip"))
+        self.assertEqual(gzip.decompress(body), STYLE)
+        _, headers, body = self.request("/style.css", {"Accept-Encoding": "gzip;q=0"})
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(body, STYLE)
+
+
+    def test_precompressedSibling_whenStale(self):
+        path = os.path.join(self.tmpdir.name, "style.css")
+        with open(path, 'wb') as f:
+            f.write(b"body {}")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        status, headers, body = self.request("/style.css", {"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual((status, body), (200, b"body {}"))
+
+
+    def test_range(self):
+        status, headers, body = self.request("/style.css", {"Range": "bytes=-5",
+                                                            "Accept-Encoding": "gzip"})
+        self.assertEqual((status, body), (206, STYLE[-5:]))
+        self.assertEqual(headers["Content-Range"], f"bytes {len(STYLE) - 5}-{len(STYLE) - 1}/"
+                                                   f"{len(STYLE)}")
+        status, headers, _ = self.request("/style.css", {"Range": f"bytes={len(STYLE)}-"})
+        self.assertEqual((status, headers["Content-Range"]), (416, f"bytes */{len(STYLE)}"))
+
+
+class TestThreadedBackend(TestRequestHandler):
+    server_class = BoundedThreadingHTTPServer
+    # the cached path of the same handler
+    cache_size = 1 << 20
+
+    def test_cacheHit_doesNotLookUpPath(self):
+        self.assertEqual(self.request("/post/")[2], b"<p>post</p>")
+        with patch.object(server, "resolve_file", side_effect=AssertionError("looked up")):
+            status, _, body = self.request("/post/")
+        self.assertEqual((status, body), (200, b"<p>post</p>"))
+        self.assertEqual(self.file_cache.hits, 1)
+
+
+class TestAsyncBackend(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        write_site(self.tmpdir.name)
+        self.file_cache = FileCache(1 << 20, revalidate_after=60)
+        self.http = AsyncHTTPServer(self.tmpdir.name, production=True, keep_alive_timeout=1.0,
+                                    file_cache=self.file_cache)
+        self.server = await asyncio.start_server(self.http.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.tmpdir.cleanup()
+
+
+    async def send(self, request: bytes):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        try:
+            writer.write(request)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), 5)
+        finally:
+            writer.close()
+        head, _, body = response.partition(b"\r\n\r\n")
+        status_line, *header_lines = head.decode('latin-1').split("\r\n")
+        headers = dict(line.split(": ", 1) for line in header_lines)
+        return int(status_line.split()[1]), headers, body
+
+
+    async def request(self, target, headers=None):
+        lines = [f"GET {target} HTTP/1.1", "Host: localhost", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        return await self.send(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+
+
+    async def test_notModified(self):
+        status, headers, _ = await self.request("/post/")
+        self.assertEqual(status, 200)
+        status, _, body = await self.request("/post/", {"If-None-Match": headers["ETag"]})
+        self.assertEqual((status, body), (304, b""))
+
+
+    async def test_precompressedSibling(self):
+        status, headers, body = await self.request("/style.css", {"Accept-Encoding": "gzip"})
+        self.assertEqual((status, headers["Content-Encoding"]), (200, "gzip"))
+        self.assertEqual(gzip.decompress(body), STYLE)
+
+
+    async def test_range(self):
+        status, headers, body = await self.request("/style.css", {"Range": "bytes=2-5"})
+        self.assertEqual((status, body), (206, STYLE[2:6]))
+        self.assertEqual(headers["Content-Range"], f"bytes 2-5/{len(STYLE)}")
+
+
+    async def test_respond_readsFilesOutsideTheLoop(self):
+        loop_thread = threading.get_ident()
+        threads = []
+        etag_for = server.etag_for
+
+        def record_thread(path, fs):
+            threads.append(threading.get_ident())
+            return etag_for(path, fs)
+
+        with patch.object(server, "etag_for", record_thread):
+            status, _, _ = await self.request("/style.css", {"Range": "bytes=0-1"})
+        self.assertEqual(status, 206)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], loop_thread)
+
+
+    async def test_cacheHit_doesNotLookUpPath(self):
+        self.assertEqual((await self.request("/post/"))[2], b"<p>post</p>")
+        with patch.object(server, "resolve_file", side_effect=AssertionError("looked up")):
+            status, _, body = await self.request("/post/")
+        self.assertEqual((status, body), (200, b"<p>post</p>"))
+        self.assertEqual(self.file_cache.hits, 1)
+
+
+    async def test_handle_answersMalformedRequests(self):
+        status, _, _ = await self.send(b"GET /\r\n\r\n")
+        self.assertEqual(status, 400)
+        status, _, _ = await self.send(b"GET / HTTP/1.1\r\nno colon\r\n\r\n")
+        self.assertEqual(status, 400)
+        # past the 64 KiB line limit of the stream reader
+        status, _, _ = await self.send(b"GET / HTTP/1.1\r\nX-Long: " + b"a" * (1 << 16)
+                                       + b"\r\n\r\n")
+        self.assertEqual(status, 400)
+
+
+    async def test_handle_closesIdleConnections(self):
+        self.http.keep_alive_timeout = 0.05
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"GET / HTTP/1.1\r\n")
+        await writer.drain()
+        self.assertEqual(await asyncio.wait_for(reader.read(), 5), b"")
+        writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
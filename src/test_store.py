@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from manifest import BuildManifest
+from store import checkout, load_index, store_dir
+
+class TestStoreDir(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmpdir.name, "public")
+        self.store = os.path.join(self.tmpdir.name, "store")
+        self.manifest = BuildManifest(os.path.join(self.tmpdir.name, "manifest.json"))
+        os.makedirs(os.path.join(self.root, "a"))
+        os.makedirs(os.path.join(self.root, "b"))
+        self.__write(os.path.join(self.root, "index.html"), "<p>home</p>")
+        self.__write(os.path.join(self.root, "a", "index.html"), "<p>same</p>")
+        self.__write(os.path.join(self.root, "b", "index.html"), "<p>same</p>")
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def __write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+    def test_storeDir_sharesObjectsOfIdenticalFiles(self):
+        stats = store_dir(self.root, self.store, self.manifest)
+        self.assertEqual((stats.files, stats.objects, stats.deduplicated), (3, 2, 1))
+        files = load_index(self.store)
+        self.assertEqual(files["a/index.html"], files["b/index.html"])
+        self.assertTrue(files["index.html"].startswith("objects/"))
+        self.assertTrue(files["index.html"].endswith(".html"))
+
+
+    def test_storeDir_writesChangedFilesOnly(self):
+        store_dir(self.root, self.store, self.manifest)
+        self.__write(os.path.join(self.root, "b", "index.html"), "<p>changed</p>")
+        os.remove(os.path.join(self.root, "index.html"))
+
+        stats = store_dir(self.root, self.store, self.manifest)
+        self.assertEqual((stats.written, stats.unchanged, stats.removed), (1, 1, 1))
+        self.assertEqual(set(self.manifest.stored), {"a/index.html", "b/index.html"})
+
+
+    def test_checkout(self):
+        store_dir(self.root, self.store)
+        dest = os.path.join(self.tmpdir.name, "site")
+        self.assertEqual(checkout(self.store, dest), 3)
+        with open(os.path.join(dest, "b", "index.html")) as f:
+            self.assertEqual(f.read(), "<p>same</p>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from leafnode import LeafNode
+from parentnode import ParentNode
+from template import Template
+
+class TestTemplate(unittest.TestCase):
+    def test_render(self):
+        template = Template("<title>{{ Title }}</title><body>{{ Content }}</body>")
+        html = template.render({"Title": "Hello", "Content": "<p>World</p>"})
+        self.assertEqual(html, "<title>Hello</title><body><p>World</p></body>")
+
+
+    def test_render_whenPlaceholderRepeats(self):
+        template = Template("{{ Title }} - {{ Title }}")
+        self.assertEqual(template.render({"Title": "A"}), "A - A")
+
+
+    def test_render_whenValueIsMissing(self):
+        template = Template("<p>{{ Date }}</p>{{ Title }}")
+        self.assertEqual(template.render({"Title": "A"}), "<p>{{ Date }}</p>A")
+
+
+    def test_render_doesNotExpandPlaceholdersInValues(self):
+        template = Template("{{ Title }}{{ Content }}")
+        html = template.render({"Title": "{{ Content }}", "Content": "body"})
+        self.assertEqual(html, "{{ Content }}body")
+
+
+    def test_placeholders(self):
+        template = Template("{{ Title }} {{Path}} {{ Description }} {{ not a placeholder }}")
+        self.assertEqual(template.placeholders, ["Title", "Path", "Description"])
+        self.assertEqual(template.literals, ["", " ", " ", " {{ not a placeholder }}"])
+
+
+    def test_render_withoutPlaceholders(self):
+        template = Template("<html></html>")
+        self.assertEqual(template.render({"Title": "A"}), "<html></html>")
+
+
+    def test_renderInto_withNodeAsValue(self):
+        template = Template("<body>{{ Content }}</body>")
+        content = ParentNode("p", [LeafNode("b", "bold"), LeafNode(None, " text")])
+
+        fragments = []
+        template.render_into(fragments.append, {"Content": content})
+
+        self.assertEqual("".join(fragments), "<body><p><b>bold</b> text</p></body>")
@@ -18,6 +18,11 @@ class TestTextNode(unittest.TestCase):
         self.assertEqual(node, node2)
 
 
+    def test_nodeHasNoInstanceDict(self):
+        node = TextNode("This is a text node", text_type_bold)
+        self.assertFalse(hasattr(node, "__dict__"))
+
+
     def test_eq_whenDifferentUrl(self):
         node = TextNode("This is a text node", text_type_bold, "http://localhost:8008")
         node2 = TextNode("This is a text node", text_type_bold, "http://localhost:8080")
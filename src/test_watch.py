@@ -0,0 +1,146 @@
+import http.client
+import os
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from assets import link_hardlink
+from manifest import BuildManifest
+from watch import SiteWatcher, serve_in_background
+
+class TestSiteWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = self.tmpdir.name
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.public = os.path.join(root, "public")
+        self.template = os.path.join(root, "template.html")
+        os.makedirs(os.path.join(self.content, "post"))
+        os.makedirs(self.static)
+        self.__write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.__write(os.path.join(self.content, "post", "index.md"), "# Post\n")
+        self.watcher = SiteWatcher(self.content, self.static, self.template, self.public)
+
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+    def __write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+        # make sure the change is visible even on coarse mtime filesystems
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, time.time_ns() + 10**9))
+
+
+    def __read(self, path):
+        with open(path, 'r') as f:
+            return f.read()
+
+
+    def __poll_and_apply(self):
+        changed, removed = self.watcher.poll()
+        with redirect_stdout(StringIO()):
+            self.watcher.apply(changed, removed)
+        return changed, removed
+
+
+    def test_poll_whenNothingChanged(self):
+        self.assertEqual(self.watcher.poll(), ([], []))
+
+
+    def test_apply_rebuildsOnlyChangedPage(self):
+        page = os.path.join(self.content, "post", "index.md")
+        self.__write(page, "# Edited\n")
+        self.__write(os.path.join(self.content, "new.md"), "# New\n")
+
+        changed, _ = self.__poll_and_apply()
+
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(self.__read(os.path.join(self.public, "post", "index.html")),
+                         "<title>Edited</title><div><h1>Edited</h1></div>")
+        self.assertTrue(os.path.exists(os.path.join(self.public, "new.html")))
+
+
+    def test_apply_whenTemplateChanges(self):
+        self.__write(self.template, "<h1>{{ Title }}</h1>")
+        self.__poll_and_apply()
+        self.assertEqual(self.__read(os.path.join(self.public, "post", "index.html")),
+                         "<h1>Post</h1>")
+
+
+    def test_apply_copiesAndRemovesStaticFiles(self):
+        asset = os.path.join(self.static, "index.css")
+        self.__write(asset, "body {}")
+        self.__poll_and_apply()
+        self.assertEqual(self.__read(os.path.join(self.public, "index.css")), "body {}")
+
+        os.remove(asset)
+        _, removed = self.__poll_and_apply()
+        self.assertEqual(removed, [asset])
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.css")))
+
+
+    def test_apply_syncsHardLinkedStaticFiles(self):
+        manifest_path = os.path.join(self.tmpdir.name, "manifest.json")
+        self.watcher = SiteWatcher(self.content, self.static, self.template, self.public,
+                                   manifest_path, link_hardlink)
+        asset = os.path.join(self.static, "index.css")
+        self.__write(asset, "body {}")
+        self.__poll_and_apply()
+        self.assertTrue(os.path.samefile(asset, os.path.join(self.public, "index.css")))
+
+        # edited in place, the copy in public is the same file
+        self.__write(asset, "body { margin: 0 }")
+        self.__poll_and_apply()
+        self.assertEqual(self.__read(os.path.join(self.public, "index.css")),
+                         "body { margin: 0 }")
+        stat = os.stat(asset)
+        entry = BuildManifest.load(manifest_path).assets["index.css"]
+        self.assertEqual((entry["mtime_ns"], entry["size"]), (stat.st_mtime_ns, stat.st_size))
+
+        os.remove(asset)
+        self.__poll_and_apply()
+        self.assertDictEqual(BuildManifest.load(manifest_path).assets, {})
+
+
+    def test_apply_whenPageIsInvalid(self):
+        self.__write(os.path.join(self.content, "post", "index.md"), "no title\n")
+        self.__poll_and_apply()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "post", "index.html")))
+
+
+    def test_apply_removesDeletedPageAndItsDirectory(self):
+        self.__write(os.path.join(self.content, "post", "index.md"), "# Post\n")
+        self.__poll_and_apply()
+        self.assertTrue(os.path.exists(os.path.join(self.public, "post", "index.html")))
+
+        os.remove(os.path.join(self.content, "post", "index.md"))
+        self.__poll_and_apply()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "post")))
+        self.assertTrue(os.path.isdir(self.public))
+
+
+    def test_serve_sendsCorsAndNoStoreHeaders(self):
+        os.makedirs(self.public)
+        self.__write(os.path.join(self.public, "index.html"), "<p>home</p>")
+        with redirect_stdout(StringIO()):
+            httpd = serve_in_background(self.public, 0)
+        try:
+            connection = http.client.HTTPConnection("localhost", httpd.server_address[1])
+            for method in ("GET", "OPTIONS"):
+                connection.request(method, "/index.html")
+                response = connection.getresponse()
+                response.read()
+                self.assertEqual(response.status, 200)
+                self.assertEqual(response.getheader("Access-Control-Allow-Origin"), "*")
+                self.assertEqual(response.getheader("Access-Control-Allow-Methods"), "GET, OPTIONS")
+                self.assertEqual(response.getheader("Cache-Control"), "no-store")
+            connection.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
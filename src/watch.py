@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from assets import copy_file, link_copy
+from buzz import generate_page, page_url_path, remove_output
+from manifest import BuildManifest, hash_file, stat_and_hash
+from template import load_template
+
+# what server.py sends, so pages can be fetched from other origins while editing
+CORS_HEADERS = (
+    ("Access-Control-Allow-Origin", "*"),
+    ("Access-Control-Allow-Methods", "GET, OPTIONS"),
+    ("Access-Control-Allow-Headers", "*"),
+)
+
+class WatchHTTPRequestHandler(SimpleHTTPRequestHandler):
+    def end_headers(self):
+        # pages change under the browser's feet, never let it cache them
+        self.send_header("Cache-Control", "no-store")
+        for name, value in CORS_HEADERS:
+            self.send_header(name, value)
+        super().end_headers()
+
+
+    def do_OPTIONS(self):
+        self.send_response(200, "OK")
+        self.end_headers()
+
+
+class SiteWatcher():
+    def __init__(self, content_dir: str, static_dir: str, template_path: str, dest_dir: str,
+                 manifest_path=None, link=link_copy):
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.template_path = template_path
+        self.dest_dir = dest_dir
+        self.link = link
+        self.manifest = BuildManifest.load(manifest_path) if manifest_path else None
+        self.template = load_template(template_path)
+        self.snapshot = self.scan()
+
+
+    def scan(self):
+        snapshot = {}
+        _scan_tree(self.content_dir, snapshot)
+        _scan_tree(self.static_dir, snapshot)
+        stat = os.stat(self.template_path)
+        snapshot[self.template_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+
+    def poll(self):
+        snapshot = self.scan()
+        changed = [path for path, signature in snapshot.items()
+                   if self.snapshot.get(path) != signature]
+        removed = [path for path in self.snapshot if path not in snapshot]
+        self.snapshot = snapshot
+        return sorted(changed), sorted(removed)
+
+
+    def apply(self, changed, removed):
+        if self.template_path in changed:
+            print(f"Template {self.template_path} changed, reloading it...")
+            self.template = load_template(self.template_path)
+            if self.manifest is not None:
+                self.manifest.set_template(hash_file(self.template_path))
+            # every page embeds the template
+            changed = ([path for path in changed if not self.__is_content(path)]
+                       + sorted(path for path in self.snapshot if self.__is_content(path)))
+
+        for path in changed:
+            if self.__is_content(path):
+                self.__generate(path)
+            elif self.__is_static(path):
+                self.__sync(path)
+
+        for path in removed:
+            if self.__is_content(path):
+                dest_path = self.__content_dest(path)
+            elif self.__is_static(path):
+                dest_path = self.__static_dest(path)
+                if self.manifest is not None:
+                    self.manifest.assets.pop(os.path.relpath(path, self.static_dir), None)
+            else:
+                continue
+            remove_output(dest_path, self.dest_dir)
+
+        if self.manifest is not None:
+            self.manifest.remove_missing(path for path in self.snapshot if self.__is_content(path))
+            self.manifest.save()
+
+
+    def __generate(self, from_path: str):
+        dest_path = self.__content_dest(from_path)
+        try:
+            stat, content_hash = stat_and_hash(from_path)
+            generate_page(from_path, self.template, dest_path,
+                          page_url_path(dest_path, self.dest_dir))
+        except Exception as e:
+            # a half-typed page must not bring the watcher down
+            print(f"Failed to generate {from_path}: {type(e).__name__}: {e}")
+            return
+        if self.manifest is not None:
+            self.manifest.record(from_path, dest_path, content_hash, stat=stat)
+
+
+    def __sync(self, src_path: str):
+        dest_path = self.__static_dest(src_path)
+        stat = os.stat(src_path)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        # a hard link of a file edited in place already holds the edit
+        if not (os.path.exists(dest_path) and os.path.samefile(src_path, dest_path)):
+            copy_file(src_path, dest_path, self.link)
+        if self.manifest is not None:
+            self.manifest.assets[os.path.relpath(src_path, self.static_dir)] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": None,
+            }
+
+
+    def __is_content(self, path: str):
+        return _is_within(path, self.content_dir)
+
+
+    def __is_static(self, path: str):
+        return _is_within(path, self.static_dir)
+
+
+    def __content_dest(self, path: str):
+        dest_path = os.path.join(self.dest_dir, os.path.relpath(path, self.content_dir))
+        if dest_path.endswith(".md"):
+            dest_path = dest_path.removesuffix(".md") + ".html"
+        return dest_path
+
+
+    def __static_dest(self, path: str):
+        return os.path.join(self.dest_dir, os.path.relpath(path, self.static_dir))
+
+
+def _scan_tree(root: str, snapshot: dict):
+    if not os.path.isdir(root):
+        return
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _scan_tree(entry.path, snapshot)
+            else:
+                stat = entry.stat()
+                snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+
+def _is_within(path: str, root: str):
+    root = os.path.abspath(root)
+    return os.path.commonpath([os.path.abspath(path), root]) == root
+
+
+def serve_in_background(directory: str, port: int):
+    handler_class = partial(WatchHTTPRequestHandler, directory=directory)
+    httpd = ThreadingHTTPServer(("", port), handler_class)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    print(f"Serving HTTP on http://localhost:{port} from directory '{directory}'...")
+    return httpd
+
+
+def watch(content_dir: str, static_dir: str, template_path: str, dest_dir: str,
+          manifest_path=None, port=8888, interval=0.2, link=link_copy):
+    watcher = SiteWatcher(content_dir, static_dir, template_path, dest_dir, manifest_path, link)
+    httpd = serve_in_background(dest_dir, port)
+    print(f"Watching {content_dir}, {static_dir} and {template_path} for changes...")
+
+    try:
+        while True:
+            time.sleep(interval)
+            changed, removed = watcher.poll()
+            if not changed and not removed:
+                continue
+            start = time.perf_counter()
+            watcher.apply(changed, removed)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Rebuilt {len(changed)} changed and {len(removed)} removed file(s) in {elapsed:.1f}ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.shutdown()